@@ -1,10 +1,10 @@
 import logging
 import asyncio
 import os
-import re
+import time
+from enum import Enum
 
 from dotenv import load_dotenv
-from google.cloud.sql.connector import Connector, IPTypes
 
 from livekit import agents
 from livekit.agents import (
@@ -13,8 +13,9 @@ from livekit.agents import (
     RoomInputOptions,
     AutoSubscribe,
     ChatContext,
+    RunContext,
+    function_tool,
 )
-from livekit.agents.llm import ChatMessage, ChatRole
 from livekit.agents import ConversationItemAddedEvent
 from livekit.plugins import (
     noise_cancellation,
@@ -22,8 +23,11 @@ from livekit.plugins import (
     silero,
 )
 from prompt import SYSTEM_PROMPT
-from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy import text
+import agent_db
+from confirmation import is_confirmation
+from history import SessionHistory
+from llm_client import LLMClient
 
 # --- THE CRITICAL LOGGING FIX: Reverted to a simpler, safer logging setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -37,8 +41,31 @@ logging.getLogger('livekit').setLevel(logging.INFO) # Keep INFO for livekit to s
 load_dotenv()
 
 
+# Set AGENT_PREWARM=0 to load per-session assets inside each job instead
+# (only useful for comparing job start latency, see bench_agent_startup.py).
+PREWARM_ENABLED = os.getenv("AGENT_PREWARM", "1") != "0"
+
+
+def load_vad():
+    """Load the Silero VAD (ONNX model + inference session)."""
+    return silero.VAD.load()
+
+
+class IdeaCategory(str, Enum):
+    KITCHEN = "Kitchen"
+    MAINTENANCE = "Maintenance"
+    OPERATIONS = "Operations"
+    HOUSEKEEPING = "Housekeeping"
+
+
+class IdeaUrgency(str, Enum):
+    LOW = "Low"
+    MEDIUM = "Medium"
+    HIGH = "High"
+
+
 class Assistant(agents.Agent):
-    def __init__(self, engine, session_id, chat_ctx: ChatContext | None = None) -> None:
+    def __init__(self, engine, session_id, vad, chat_ctx: ChatContext | None = None) -> None:
         super().__init__(
             instructions=SYSTEM_PROMPT,
             chat_ctx=chat_ctx,
@@ -48,35 +75,134 @@ class Assistant(agents.Agent):
                 temperature=0.5,
                 instructions=SYSTEM_PROMPT,
             ),
-            vad=silero.VAD.load(),
+            vad=vad,
         )
         self._engine = engine
         self._session_id = session_id
+        self._last_user_message = ""
 
     async def process(self, ctx: agents.RunContext):
         return
 
+    def note_user_message(self, content: str) -> None:
+        self._last_user_message = content
+
+    @function_tool()
+    async def submit_idea(
+        self,
+        context: RunContext,
+        idea_title: str,
+        explanation: str,
+        category: IdeaCategory,
+        urgency: IdeaUrgency,
+        user_confirmed: bool,
+        expected_impact: str = "",
+        estimated_cost: str = "",
+    ) -> str:
+        """Save the user's idea. Call this only after the user has confirmed the summary and asked you to submit it.
+
+        Args:
+            idea_title: Short title of the idea, in English.
+            explanation: What should change and how, in English.
+            category: The department the idea belongs to.
+            urgency: How soon the idea should be acted on.
+            user_confirmed: True only if the user's latest reply confirmed the summary and asked to submit.
+            expected_impact: Expected benefit, in English.
+            estimated_cost: Rough cost estimate, in English (e.g. "Approx. 400 rupees per cloth").
+        """
+        if not user_confirmed:
+            return "The user has not confirmed yet. Ask them whether you should submit the idea, and wait for their answer."
+        # Advisory only: the transcript can lag the tool call, and phrasings
+        # vary, so a disagreement is logged for review rather than enforced.
+        if not is_confirmation(self._last_user_message):
+            logger.warning(
+                "submit_idea confirmed by the model but not by the matcher: '%s' (last user message: '%s')",
+                idea_title, self._last_user_message,
+            )
+
+        try:
+            async with self._engine.begin() as conn:
+                # Serialize submissions per session so a retried or repeated
+                # tool call sees the row the first one inserted.
+                await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:sid))"), {"sid": self._session_id})
+                existing = await conn.execute(
+                    text("""
+                        SELECT id FROM curated_ideas
+                        WHERE session_id = :session_id
+                          AND lower(idea_title) = lower(:idea_title)
+                          AND lower(explanation) = lower(:explanation)
+                        LIMIT 1
+                    """),
+                    {"session_id": self._session_id, "idea_title": idea_title.strip(), "explanation": explanation.strip()},
+                )
+                existing_id = existing.scalar_one_or_none()
+                if existing_id is not None:
+                    logger.info("Idea already saved as id=%s; not submitting '%s' again.", existing_id, idea_title)
+                    return "This idea was already submitted. Do not submit it again."
+
+                res = await conn.execute(text("SELECT created_by FROM sessions WHERE id = :sid"), {"sid": self._session_id})
+                row = res.mappings().one_or_none()
+                created_by = row.get("created_by") if row else None
+
+                result = await conn.execute(
+                    text("""
+                        INSERT INTO curated_ideas (session_id, created_by, idea_title, explanation, category, expected_impact, estimated_cost, urgency, approved)
+                        VALUES (:session_id, :created_by, :idea_title, :explanation, :category, :expected_impact, :estimated_cost, :urgency, :approved)
+                        RETURNING id
+                    """),
+                    {
+                        "session_id": self._session_id, "created_by": created_by,
+                        "idea_title": idea_title.strip(), "explanation": explanation.strip(),
+                        "category": IdeaCategory(category).value, "expected_impact": expected_impact.strip(),
+                        "estimated_cost": estimated_cost.strip(), "urgency": IdeaUrgency(urgency).value,
+                        "approved": None,
+                    },
+                )
+                idea_id = result.scalar_one()
+        except Exception as e:
+            logger.error("❌ DB SUBMISSION FAILED: %s", e)
+            return "Saving the idea failed. Apologize to the user and ask them to try submitting again in a moment."
+
+        logger.info("✅ CURATED IDEA SAVED TO DB: id=%s Title='%s'", idea_id, idea_title)
+        return "The idea has been saved. Now deliver the 'Final Submission Confirmation' message in the user's chosen language."
+
+
+def prewarm(proc: agents.JobProcess):
+    """Runs once per worker process, before it is handed any job."""
+    # Used to summarize older turns of long sessions (see history.py).
+    summarizer = LLMClient(model_name=os.getenv("HISTORY_SUMMARY_MODEL", "gemini-2.5-flash"), timeout=30)
+    summarizer.configure(os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+    proc.userdata["summarizer"] = summarizer
+    if PREWARM_ENABLED:
+        started = time.perf_counter()
+        proc.userdata["vad"] = load_vad()
+        logger.info("Prewarmed Silero VAD in %.0f ms (pid %d).", (time.perf_counter() - started) * 1000, os.getpid())
+
 
 async def entrypoint(ctx: agents.JobContext):
-    await ctx.connect(auto_subscribe=AutoSubscribe.SUBSCRIBE_ALL)
-    await ctx.wait_for_participant()
-    session_id = ctx.room.name
+    job_started = time.perf_counter()
+    # Start opening a connection now so it overlaps with joining the room.
+    connector, engine = await agent_db.open_database()
+    session_history = None
 
-    instance_connection_name = os.environ["CLOUD_SQL_CONNECTION_NAME"]
-    db_user = os.environ["DB_USER"]
-    db_pass = os.environ["DB_PASS"]
-    db_name = os.environ["DB_NAME"]
+    async def _on_shutdown(*_):
+        if session_history is not None:
+            await session_history.close()
+        await agent_db.close_database(connector, engine)
 
-    connector = Connector()
+    ctx.add_shutdown_callback(_on_shutdown)
 
-    async def getconn():
-        conn = await connector.connect_async(
-            instance_connection_name, "asyncpg", user=db_user,
-            password=db_pass, db=db_name, ip_type=IPTypes.PUBLIC
-        )
-        return conn
+    async def _warm_db():
+        try:
+            await agent_db.warm(engine)
+        except Exception as e:
+            logger.warning("Database warm-up failed: %s", e)
+
+    warm_task = asyncio.create_task(_warm_db())
 
-    engine = create_async_engine("postgresql+asyncpg://", async_creator=getconn)
+    await ctx.connect(auto_subscribe=AutoSubscribe.SUBSCRIBE_ALL)
+    await ctx.wait_for_participant()
+    session_id = ctx.room.name
 
     try:
         async with engine.begin() as conn:
@@ -90,59 +216,49 @@ async def entrypoint(ctx: agents.JobContext):
     except Exception as e:
         logger.warning("Session check/upsert failed: %s", e)
 
-    # ADD THIS: Load prior conversation history to restore context
-    history = []
+    # Restore a bounded context: rolling summary of older turns + latest turns verbatim.
     chat_ctx = None
+    session_history = SessionHistory(
+        engine, ctx.proc.userdata["summarizer"], session_id,
+        recent_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "2000")),
+    )
     try:
         logger.info("Attempting to load history for session: %s", session_id)
-        async with engine.begin() as conn:
-            # Load prior messages deterministically by timestamp (oldest → newest).
-            # Use NULLS LAST to avoid random ordering when some rows lack timestamps.
-            res = await conn.execute(
-                text(
-                    """
-                    SELECT role, text_content
-                    FROM messages
-                    WHERE session_id = :sid
-                      AND text_content IS NOT NULL AND text_content <> ''
-                    ORDER BY timestamp ASC NULLS LAST
-                    LIMIT 200
-                    """
-                ),
-                {"sid": session_id},
-            )
-            db_history = res.mappings().all()
-
-        if db_history:
-            for row in db_history:
-                role = ChatRole.USER if row['role'] == 'user' else ChatRole.ASSISTANT
-                history.append(ChatMessage(role=role, text=row['text_content']))
-
-            chat_ctx = ChatContext(messages=history)
-            logger.info("Restored %d messages from history.", len(history))
+        summary, turns = await session_history.restore()
+        if summary or turns:
+            chat_ctx = ChatContext.empty()
+            if summary:
+                chat_ctx.add_message(role="system", content=f"Summary of the earlier conversation:\n{summary}")
+            for role_value, content in turns:
+                chat_ctx.add_message(role="user" if role_value == "user" else "assistant", content=content)
+            logger.info("Restored %d recent messages%s from history.", len(turns), " and a summary" if summary else "")
         else:
             logger.info("No prior history found for session %s", session_id)
 
-    except Exception as e:
-        logger.error("Failed to load message history: %s", e)
+    except Exception:
+        logger.exception("Failed to load message history for session %s", session_id)
 
 
+    vad = ctx.proc.userdata.get("vad") or load_vad()
+    # The restored context reaches the model through the agent's chat_ctx.
+    assistant = Assistant(engine=engine, session_id=session_id, vad=vad, chat_ctx=chat_ctx)
     session = AgentSession()
-    last_idea_form: dict | None = None
 
-    # Explicitly attach restored chat context to the session
-    if chat_ctx is not None:
-        try:
-            session.chat_ctx = chat_ctx
-            logger.info("Attached restored ChatContext to session.")
-        except Exception as e:
-            logger.warning("Failed to attach ChatContext to session: %s", e)
+    greeted = False
+
+    @session.on("agent_state_changed")
+    def _on_first_speech(event):
+        nonlocal greeted
+        if event.new_state == "speaking" and not greeted:
+            greeted = True
+            logger.info(
+                "Job start to first greeting: %.0f ms (prewarmed=%s).",
+                (time.perf_counter() - job_started) * 1000, "vad" in ctx.proc.userdata,
+            )
 
     @session.on("conversation_item_added")
     def on_conversation_item_added(event: ConversationItemAddedEvent):
         async def _persist():
-            nonlocal last_idea_form
-
             item = event.item
             text_content = getattr(item, "text_content", None)
             if not text_content: return
@@ -158,136 +274,18 @@ async def entrypoint(ctx: agents.JobContext):
                         text("INSERT INTO messages (session_id, role, text_content) VALUES (:session_id, :role, :text)"),
                         {"session_id": session_id, "role": normalized_role, "text": text_content},
                     )
+                session_history.note_message(text_content)
             except Exception as e:
                 logger.error("Failed to persist message (role=%s): %s", normalized_role, e)
 
-            if (
-                normalized_role == "model"
-                and "Idea Title:" in text_content
-                and "Explanation:" in text_content
-            ):
-                try:
-                    def extract_field(text, start_keyword, end_keywords):
-                        clean_text = text.replace('**', '')
-                        start_index = clean_text.find(start_keyword)
-                        if start_index == -1: return None
-                        start_index += len(start_keyword)
-                        end_index = len(clean_text)
-                        for end_keyword in end_keywords:
-                            found_end = clean_text.find(end_keyword, start_index)
-                            if found_end != -1:
-                                end_index = min(end_index, found_end)
-                        return clean_text[start_index:end_index].strip()
-
-                    form_data = {}
-                    form_data['idea_title'] = extract_field(text_content, "Idea Title:", ["Explanation:"])
-                    form_data['explanation'] = extract_field(text_content, "Explanation:", ["Category:"])
-                    form_data['category'] = extract_field(text_content, "Category:", ["Expected Impact:"])
-                    form_data['expected_impact'] = extract_field(text_content, "Expected Impact:", ["Estimated Cost:"])
-                    form_data['estimated_cost'] = extract_field(text_content, "Estimated Cost:", ["Urgency:"])
-                    form_data['urgency'] = extract_field(text_content, "Urgency:", ["\n", "Does this look right", "क्या यह सही लग रहा है"])
-
-                    if all(form_data.get(k) for k in ["idea_title", "explanation", "category", "urgency"]):
-                        last_idea_form = form_data
-                        logger.info("✅ FORM CAPTURED: Ready for submission. Title: '%s'", form_data.get('idea_title'))
-                    else:
-                        logger.warning("⚠️ FORM PARSE FAILED: Could not parse all required fields.")
-                except Exception as e:
-                    logger.warning("⚠️ FORM PARSE EXCEPTION: %s", e)
-
-            # def is_user_confirmation(msg: str) -> bool:
-            #     m = (msg or "").strip().lower().replace('.', '').replace('।', '')
-            #     confirmation_keywords = [
-            #         'submit', 'confirm', 'finalize', 'finalise', 'go ahead', 'looks good',
-            #         'all good', 'correct', "that's correct", 'yes please', 'theek hai',
-            #         'haan theek hai', 'ok hai', 'kar do', 'as it is', 'सबमिट', 'हाँ', 'ठीक है'
-            #     ]
-            #     for keyword in confirmation_keywords:
-            #         if keyword in m:
-            #             return True
-            #     if "सबमिट कर" in m or "सबमिट कीजिए" in m:
-            #         return True
-            #     return False
-
-            def is_user_confirmation(msg: str) -> bool:
-                m = (msg or "").strip().lower().replace('.', '').replace('।', '')
-                
-                confirmation_keywords = [
-                    # English
-                    'submit', 'confirm', 'finalize', 'finalise', 'go ahead', 'looks good',
-                    'all good', 'correct', "that's correct", 'yes please',
-
-                    # Hindi
-                    'theek hai', 'haan theek hai', 'ok hai', 'kar do', 'as it is', 
-                    'सबमिट', 'हाँ', 'ठीक है',
-
-                    # Marathi
-                    'ho', 'theek aahe', 'karun taka', 'submit kara', 
-                    'हो', 'ठीक आहे', 'सबमिट करा'
-                ]
-
-                for keyword in confirmation_keywords:
-                    if keyword in m:
-                        return True
-                # Handle multi-word phrases in Hindi/Marathi
-                if "सबमिट कर" in m or "सबमिट कीजिए" in m:
-                    return True
-                return False
-
-            if normalized_role == "user" and is_user_confirmation(text_content):
-                if last_idea_form:
-                    logger.info("USER CONFIRMED: Attempting to save idea '%s'.", last_idea_form.get('idea_title'))
-                    try:
-                        async with engine.begin() as conn:
-                            res = await conn.execute(text("SELECT created_by FROM sessions WHERE id = :sid"), {"sid": session_id})
-                            row = res.mappings().one_or_none()
-                            created_by = row.get("created_by") if row else None
-
-                            await conn.execute(
-                                text("""
-                                    INSERT INTO curated_ideas (session_id, created_by, idea_title, explanation, category, expected_impact, estimated_cost, urgency, approved)
-                                    VALUES (:session_id, :created_by, :idea_title, :explanation, :category, :expected_impact, :estimated_cost, :urgency, :approved)
-                                """),
-                                {
-                                    "session_id": session_id, "created_by": created_by,
-                                    "idea_title": last_idea_form.get("idea_title",""), "explanation": last_idea_form.get("explanation",""),
-                                    "category": last_idea_form.get("category",""), "expected_impact": last_idea_form.get("expected_impact", ""),
-                                    "estimated_cost": last_idea_form.get("estimated_cost", ""), "urgency": last_idea_form.get("urgency",""),
-                                    "approved": None,
-                                },
-                            )
-                        # This is your desired log for curated ideas
-                        # logger.info("✅ CURATED IDEA SAVED TO DB: Title='%s'", last_idea_form.get('idea_title'))
-
-                        # async def _notify_user():
-                        #     await asyncio.sleep(0.5)
-                        #     await session.generate_reply(instructions="Confirm to the user in their language that their idea has been successfully submitted and thank them.")
-
-                        # asyncio.create_task(_notify_user())
-
-                        # last_idea_form = None
-                        logger.info("✅ CURATED IDEA SAVED TO DB: Title='%s'", last_idea_form.get('idea_title'))
-
-                        async def _notify_user():
-                            await asyncio.sleep(0.5)
-                            # HIGHLIGHTED CHANGE: This new instruction is very specific and points to our prompt.
-                            await session.generate_reply(
-                                instructions="The idea has been saved. Your ONLY task is to deliver the 'Final Submission Confirmation' message in the user's chosen language."
-                            )
-
-                        asyncio.create_task(_notify_user())
-
-                        last_idea_form = None
-                    except Exception as e:
-                        logger.error("❌ DB SUBMISSION FAILED: %s", e)
-                else:
-                    logger.warning("⚠️ USER CONFIRMED, BUT NO FORM CAPTURED RECENTLY.")
+            if normalized_role == "user":
+                assistant.note_user_message(text_content)
 
         asyncio.create_task(_persist())
 
     await session.start(
         room=ctx.room,
-        agent=Assistant(engine=engine, session_id=session_id, chat_ctx=chat_ctx),
+        agent=assistant,
         room_input_options=RoomInputOptions(
             noise_cancellation=noise_cancellation.BVC(),
             close_on_disconnect=False,
@@ -303,7 +301,7 @@ async def entrypoint(ctx: agents.JobContext):
             )
         asyncio.create_task(_greet())
 
-    if not history:
+    if chat_ctx is None:
         await session.generate_reply(
             instructions="""Your ONLY task is to say the following phrase verbatim, with no extra words or translation: "नमस्ते! Welcome to the ROKA Voice Idea Agent. To chat in English, please say 'English'. हिंदी में बात करने के लिए, 'हिंदी' कहिए। आणि मराठीत बोलण्यासाठी, 'मराठी' म्हणा." """
         )
@@ -313,12 +311,5 @@ async def entrypoint(ctx: agents.JobContext):
         )
 
 
-    @session.on("close")
-    def on_close(_):
-        async def _cleanup():
-            if engine: await engine.dispose()
-            if connector: await connector.close_async()
-        asyncio.create_task(_cleanup())
-
 if __name__ == "__main__":
-    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint))
\ No newline at end of file
+    agents.cli.run_app(agents.WorkerOptions(entrypoint_fnc=entrypoint, prewarm_fnc=prewarm))
\ No newline at end of file
@@ -0,0 +1,54 @@
+# agent_db.py
+import logging
+import os
+import time
+
+from google.cloud.sql.connector import IPTypes, create_async_connector
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+logger = logging.getLogger(__name__)
+
+# Per job, not per worker: LiveKit runs each job in its own process, and the
+# connector must live on the job's event loop, so there is nothing to share.
+
+
+async def open_database():
+    """Create the job's Cloud SQL connector and a small pooled engine. Returns (connector, engine)."""
+    connector = await create_async_connector()
+
+    async def getconn():
+        return await connector.connect_async(
+            os.environ["CLOUD_SQL_CONNECTION_NAME"],
+            "asyncpg",
+            user=os.environ["DB_USER"],
+            password=os.environ["DB_PASS"],
+            db=os.environ["DB_NAME"],
+            ip_type=IPTypes.PUBLIC,
+        )
+
+    engine = create_async_engine(
+        "postgresql+asyncpg://",
+        async_creator=getconn,
+        pool_size=int(os.getenv("AGENT_DB_POOL_SIZE", "2")),
+        max_overflow=int(os.getenv("AGENT_DB_MAX_OVERFLOW", "2")),
+        pool_timeout=10,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+    )
+    return connector, engine
+
+
+async def warm(engine):
+    """Open the first pooled connection; returns the time it took in seconds."""
+    started = time.perf_counter()
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    elapsed = time.perf_counter() - started
+    logger.info("Database pool warm in %.0f ms (pid %d).", elapsed * 1000, os.getpid())
+    return elapsed
+
+
+async def close_database(connector, engine):
+    await engine.dispose()
+    await connector.close_async()
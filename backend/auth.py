@@ -0,0 +1,195 @@
+# auth.py
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from db_schema import users
+
+# scrypt cost parameters (~50 ms and 16 MiB per hash on a Cloud Run vCPU).
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+HASH_PREFIX = "scrypt$"
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode()
+
+
+def hash_password(password):
+    """Return a salted scrypt hash encoded as scrypt$n$r$p$salt$hash."""
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P)
+    return f"{HASH_PREFIX}{SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}"
+
+
+def is_password_hash(value):
+    return bool(value) and value.startswith(HASH_PREFIX)
+
+
+def verify_password(password, stored):
+    """Check `password` against a hash from `hash_password` in constant time."""
+    if not is_password_hash(stored):
+        return False
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        digest = hashlib.scrypt(
+            password.encode(), salt=base64.b64decode(salt), n=int(n), r=int(r), p=int(p),
+        )
+    except (ValueError, TypeError):
+        return False
+    return hmac.compare_digest(digest, base64.b64decode(expected))
+
+
+class _TTLCache:
+    """Small bounded LRU whose entries expire after `ttl` seconds."""
+
+    def __init__(self, max_entries, ttl):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self._ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class Authenticator:
+    """
+    Verifies username/password pairs against the `users` table.
+
+    scrypt only runs on a cache miss and off the event loop. Successful
+    verifications are remembered as an HMAC of the credentials under a
+    per-process random key, so the cache never holds plaintext passwords and
+    repeat requests (dashboard polling) cost one HMAC and a dict lookup.
+    """
+
+    def __init__(self, max_entries=1024, verified_ttl=300, user_ttl=60):
+        self._key = os.urandom(32)
+        self._verified = _TTLCache(max_entries, verified_ttl)
+        self._users = _TTLCache(max_entries, user_ttl)
+        self.hits = 0
+        self.misses = 0
+
+    def _credential_digest(self, user_row, password):
+        # Binding the stored hash means a password change invalidates old entries.
+        message = f"{user_row['id']}\0{user_row['password']}\0{password}".encode()
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    async def _lookup_user(self, engine, username):
+        user_row = self._users.get(username)
+        if user_row is None:
+            async with engine.connect() as conn:
+                result = await conn.execute(
+                    select(users.c.id, users.c.username, users.c.password).where(users.c.username == username)
+                )
+                row = result.mappings().one_or_none()
+            if row is None:
+                return None
+            user_row = dict(row)
+            self._users.set(username, user_row)
+        return user_row
+
+    async def authenticate(self, engine, username, password):
+        """Return {'id', 'username'} for valid credentials, otherwise None."""
+        if engine is None or not username or not password:
+            return None
+        user_row = await self._lookup_user(engine, username)
+        if user_row is None:
+            return None
+
+        digest = self._credential_digest(user_row, password)
+        if self._verified.get(username) == digest:
+            self.hits += 1
+            return {"id": user_row["id"], "username": user_row["username"]}
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, verify_password, password, user_row["password"]):
+            return None
+        self._verified.set(username, digest)
+        return {"id": user_row["id"], "username": user_row["username"]}
+
+    def forget(self, username):
+        """Drop cached state for a user (e.g. after a password change)."""
+        self._verified.discard(username)
+        self._users.discard(username)
+
+    def stats(self):
+        return {"verified": len(self._verified), "users": len(self._users), "hits": self.hits, "misses": self.misses}
+
+
+class StreamTokenSigner:
+    """
+    Short-lived HMAC-signed tokens for endpoints a browser opens with
+    EventSource, which cannot send an Authorization header. A token names the
+    user and the one `scope` it is valid for, and expires after `ttl` seconds.
+
+    Every server instance must share `secret` (STREAM_TOKEN_SECRET) so a token
+    issued by one instance is accepted by another. A random per-process key
+    only works with a single instance.
+    """
+
+    def __init__(self, secret=None, ttl=300):
+        self._key = secret.encode() if secret else os.urandom(32)
+        self.shared = bool(secret)
+        self.ttl = ttl
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload, hashlib.sha256).digest()
+
+    def issue(self, user, scope):
+        """Return a token for `user` ({'id', 'username'}) valid for `scope`."""
+        payload = json.dumps(
+            {"id": user["id"], "username": user["username"], "scope": scope, "exp": int(time.time() + self.ttl)},
+            separators=(",", ":"),
+        ).encode()
+        return f"{_b64url(payload)}.{_b64url(self._sign(payload))}"
+
+    def verify(self, token, scope):
+        """Return {'id', 'username'} for a valid, unexpired token for `scope`, otherwise None."""
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = _unb64url(encoded_payload)
+            if not hmac.compare_digest(self._sign(payload), _unb64url(encoded_signature)):
+                return None
+            claims = json.loads(payload)
+        except (ValueError, TypeError, AttributeError):
+            return None
+        if claims.get("scope") != scope or claims.get("exp", 0) < time.time():
+            return None
+        return {"id": claims["id"], "username": claims["username"]}
+
+
+def _b64url(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64url(value):
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
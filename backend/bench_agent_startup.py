@@ -0,0 +1,125 @@
+# bench_agent_startup.py
+"""
+Measures per-process asset load time at agent job start, with and without
+prewarming. It does not measure time to the first greeting: no room,
+session or model is involved.
+
+Each trial runs in a fresh process, like a new LiveKit job process. In
+`cold` mode the job loads the Silero VAD itself, as it did before
+`prewarm()`. In `prewarmed` mode `agent.prewarm()` runs first (as the worker
+does for idle processes), so the job's `vad` step is only a `proc.userdata`
+lookup and is expected to be close to zero. The cold `vad` time is the load
+that prewarming moves off the job's critical path. With --db the job also
+opens its first pooled Cloud SQL connection (CLOUD_SQL_CONNECTION_NAME,
+DB_USER, DB_PASS and DB_NAME must be set); prewarming does not change that
+step.
+
+    python bench_agent_startup.py --trials 10 --db
+
+Reports p50/p95 per mode and writes them to bench-results/. Job assignment
+to first greeting is logged by agent.py in production as "Job start to
+first greeting". Compare deployments with AGENT_PREWARM=1 and
+AGENT_PREWARM=0 for the end-to-end number.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from bench_load import percentile
+
+
+class FakeProc:
+    """Stands in for livekit.agents.JobProcess (only `userdata` is used)."""
+
+    def __init__(self):
+        self.userdata = {}
+
+
+async def job_setup(proc, with_db):
+    """What entrypoint() does with per-process assets before it can greet."""
+    import agent
+
+    started = time.perf_counter()
+    vad = proc.userdata.get("vad") or agent.load_vad()
+    timings = {"vad_ms": (time.perf_counter() - started) * 1000}
+    if with_db:
+        db_started = time.perf_counter()
+        connector, engine = await agent.agent_db.open_database()
+        await agent.agent_db.warm(engine)
+        timings["db_ms"] = (time.perf_counter() - db_started) * 1000
+        await agent.agent_db.close_database(connector, engine)
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    return vad, timings
+
+
+def child(mode, with_db):
+    import agent
+
+    proc = FakeProc()
+    if mode == "prewarmed":
+        agent.prewarm(proc)
+    _, timings = asyncio.run(job_setup(proc, with_db))
+    print(json.dumps(timings))
+
+
+def run_trial(mode, with_db):
+    args = [sys.executable, __file__, "--child", mode] + (["--db"] if with_db else [])
+    env = dict(os.environ, AGENT_PREWARM="1" if mode == "prewarmed" else "0")
+    output = subprocess.run(args, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = sorted(s[key] for s in samples)
+        summary[key] = {
+            "p50": round(percentile(values, 50), 1),
+            "p95": round(percentile(values, 95), 1),
+            "mean": round(statistics.fmean(values), 1),
+        }
+    return summary
+
+
+def main(args):
+    results = {}
+    for mode in ("cold", "prewarmed"):
+        print(f"⏱️ {args.trials} {mode} trials...")
+        results[mode] = summarize([run_trial(mode, args.db) for _ in range(args.trials)])
+
+    print(f"\n{'mode':<11}{'step':<10}{'p50':>10}{'p95':>10}")
+    for mode, summary in results.items():
+        for step, stats in summary.items():
+            print(f"{mode:<11}{step.removesuffix('_ms'):<10}{stats['p50']:>8.1f}ms{stats['p95']:>8.1f}ms")
+
+    report = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": {"trials": args.trials, "db": args.db},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "bench-results", f"agent-startup-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Report written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--db", action="store_true", help="include opening the first Cloud SQL connection")
+    parser.add_argument("--child", choices=["cold", "prewarmed"], help=argparse.SUPPRESS)
+    parser.add_argument("--output", help="report path (default bench-results/agent-startup-<timestamp>.json)")
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.db)
+    else:
+        main(args)
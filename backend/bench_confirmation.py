@@ -0,0 +1,111 @@
+# bench_confirmation.py
+"""
+Accuracy and per-message cost of the confirmation matcher used to gate the
+agent's submit_idea tool.
+
+Runs confirmation.is_confirmation and the previous substring-scan matcher
+over the labeled English/Hindi/Marathi corpus in confirmation_corpus.tsv
+(one `label<TAB>utterance` per line, 1 = confirms the submission).
+
+    python bench_confirmation.py --repeat 2000
+
+Prints accuracy, false positives and false negatives (listing the
+misclassified utterances), and mean microseconds per message. The report is
+written to bench-results/.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+from confirmation import is_confirmation
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "confirmation_corpus.tsv")
+
+
+def legacy_is_confirmation(msg):
+    """The matcher agent.py used before confirmation.py, kept as the baseline."""
+    m = (msg or "").strip().lower().replace('.', '').replace('।', '')
+    confirmation_keywords = [
+        'submit', 'confirm', 'finalize', 'finalise', 'go ahead', 'looks good',
+        'all good', 'correct', "that's correct", 'yes please',
+        'theek hai', 'haan theek hai', 'ok hai', 'kar do', 'as it is',
+        'सबमिट', 'हाँ', 'ठीक है',
+        'ho', 'theek aahe', 'karun taka', 'submit kara',
+        'हो', 'ठीक आहे', 'सबमिट करा'
+    ]
+    for keyword in confirmation_keywords:
+        if keyword in m:
+            return True
+    if "सबमिट कर" in m or "सबमिट कीजिए" in m:
+        return True
+    return False
+
+
+MATCHERS = {"compiled": is_confirmation, "legacy": legacy_is_confirmation}
+
+
+def load_corpus(path):
+    corpus = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line or line.startswith("#"):
+                continue
+            label, utterance = line.split("\t", 1)
+            corpus.append((label == "1", utterance))
+    return corpus
+
+
+def evaluate(matcher, corpus, repeat):
+    false_positives = [u for expected, u in corpus if not expected and matcher(u)]
+    false_negatives = [u for expected, u in corpus if expected and not matcher(u)]
+    utterances = [u for _, u in corpus]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for utterance in utterances:
+            matcher(utterance)
+    elapsed = time.perf_counter() - started
+    return {
+        "accuracy": round(1 - (len(false_positives) + len(false_negatives)) / len(corpus), 4),
+        "false_positives": false_positives,
+        "false_negatives": false_negatives,
+        "us_per_message": round(elapsed / (repeat * len(utterances)) * 1e6, 3),
+    }
+
+
+def main(args):
+    corpus = load_corpus(args.corpus)
+    print(f"⏱️ {len(corpus)} utterances x {args.repeat} repeats...")
+    results = {name: evaluate(matcher, corpus, args.repeat) for name, matcher in MATCHERS.items()}
+
+    print(f"\n{'matcher':<10}{'accuracy':>10}{'FP':>5}{'FN':>5}{'µs/msg':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['accuracy']:>10.1%}{len(r['false_positives']):>5}"
+              f"{len(r['false_negatives']):>5}{r['us_per_message']:>10.2f}")
+    for name, r in results.items():
+        for kind in ("false_positives", "false_negatives"):
+            for utterance in r[kind]:
+                print(f"  {name} {kind[:-1].replace('_', ' ')}: {utterance}")
+
+    report = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "config": {"corpus": args.corpus, "utterances": len(corpus), "repeat": args.repeat},
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        "bench-results", f"confirmation-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"📝 Report written to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--output", help="report path (default bench-results/confirmation-<timestamp>.json)")
+    main(parser.parse_args())
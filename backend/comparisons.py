@@ -0,0 +1,160 @@
+# comparisons.py
+import hashlib
+import json
+from collections import OrderedDict
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db_schema import idea_comparisons
+from prompt import COMPARE_IDEAS_PROMPT, COMPARE_PROMPT_VERSION, RANK_IDEAS_PROMPT, RANK_PROMPT_VERSION
+
+# (payload key, label in the prompt) for every idea field sent to Gemini.
+COMPARED_FIELDS = (
+    ("idea_title", "Title"),
+    ("explanation", "Description"),
+    ("category", "Category"),
+    ("expected_impact", "Expected Impact"),
+    ("estimated_cost", "Estimated Cost"),
+    ("urgency", "Urgency"),
+)
+
+
+def idea_digest(idea):
+    """Content hash of the compared fields of one idea."""
+    payload = {key: idea.get(key) for key, _ in COMPARED_FIELDS}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+
+def canonical_pair(idea1, idea2):
+    """
+    Order two ideas by content digest so that (a, b) and (b, a) produce the same
+    prompt and cache key. Returns (first, second, cache_key).
+    """
+    d1, d2 = idea_digest(idea1), idea_digest(idea2)
+    if d2 < d1:
+        idea1, idea2, d1, d2 = idea2, idea1, d2, d1
+    key = hashlib.sha256(f"{COMPARE_PROMPT_VERSION}:{d1}:{d2}".encode()).hexdigest()
+    return idea1, idea2, key
+
+
+def format_idea(idea):
+    return "\n".join(f"{label}: {idea.get(key, 'N/A')}" for key, label in COMPARED_FIELDS)
+
+
+def build_comparison_prompt(idea1, idea2):
+    return COMPARE_IDEAS_PROMPT.format(idea1=format_idea(idea1), idea2=format_idea(idea2))
+
+
+# Stored as idea_comparisons.prompt_version for ranking entries, so they are
+# never mistaken for pairwise comparisons made with COMPARE_PROMPT_VERSION.
+RANKING_PROMPT_VERSION = f"rank:{RANK_PROMPT_VERSION}"
+
+
+def ranking_key(ideas):
+    """Order-independent cache key for scoring one group of ideas."""
+    digests = sorted(f"{idea['id']}:{idea_digest(idea)}" for idea in ideas)
+    return hashlib.sha256(f"{RANKING_PROMPT_VERSION}:{':'.join(digests)}".encode()).hexdigest()
+
+
+def build_ranking_prompt(ideas):
+    blocks = [f"Idea id {idea['id']}:\n{format_idea(idea)}" for idea in ideas]
+    return RANK_IDEAS_PROMPT.format(ideas="\n\n".join(blocks))
+
+
+def parse_ranking(text, idea_ids):
+    """
+    Parse the model's JSON scores into {idea_id: {"score", "rationale"}} for
+    the group's `idea_ids`. Tolerates markdown code fences around the array;
+    ids outside the group are ignored and a missing id fails the parse.
+    """
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("ranking response did not contain a JSON array")
+    wanted = set(idea_ids)
+    scores = {}
+    for item in json.loads(text[start:end + 1]):
+        idea_id = int(item["id"])
+        if idea_id not in wanted:
+            continue
+        scores[idea_id] = {
+            "score": float(item["score"]),
+            "rationale": str(item.get("rationale", "")),
+        }
+    missing = wanted - scores.keys()
+    if missing:
+        raise ValueError(f"ranking response did not score ideas {sorted(missing)}")
+    return scores
+
+
+def payload_idea_id(idea):
+    """The idea's integer id, if the payload carries one."""
+    value = idea.get("id")
+    return value if isinstance(value, int) else None
+
+
+class ComparisonCache:
+    """
+    Two-tier cache of Gemini comparisons keyed by `canonical_pair` hashes:
+    a bounded in-process LRU in front of the durable `idea_comparisons` table.
+
+    Because the key is derived from the ideas' content and the prompt version,
+    editing either idea (or the prompt) yields a new key; rows for deleted
+    ideas are removed by the table's ON DELETE CASCADE foreign keys.
+    """
+
+    def __init__(self, max_entries=1000):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, comparison):
+        self._entries[key] = comparison
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, engine, key):
+        comparison = self._entries.get(key)
+        if comparison is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return comparison
+        if engine is not None:
+            try:
+                async with engine.connect() as conn:
+                    result = await conn.execute(
+                        select(idea_comparisons.c.comparison).where(idea_comparisons.c.cache_key == key)
+                    )
+                    comparison = result.scalar()
+            except Exception as e:
+                print(f"⚠️ Comparison cache lookup failed, regenerating: {e}")
+            if comparison is not None:
+                self._remember(key, comparison)
+                self.hits += 1
+                return comparison
+        self.misses += 1
+        return None
+
+    async def put(self, engine, key, comparison, model_name, idea_a_id=None, idea_b_id=None,
+                  prompt_version=COMPARE_PROMPT_VERSION):
+        self._remember(key, comparison)
+        if engine is None:
+            return
+        async with engine.begin() as conn:
+            await conn.execute(
+                insert(idea_comparisons)
+                .values(
+                    cache_key=key,
+                    prompt_version=prompt_version,
+                    idea_a_id=idea_a_id,
+                    idea_b_id=idea_b_id,
+                    model=model_name,
+                    comparison=comparison,
+                )
+                .on_conflict_do_nothing(index_elements=["cache_key"])
+            )
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
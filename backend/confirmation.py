@@ -0,0 +1,98 @@
+# confirmation.py
+import re
+import unicodedata
+
+# Devanagari vowel signs are combining marks, which `\w` alone splits words on.
+# The danda and double danda (U+0964, U+0965) are sentence punctuation.
+_TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u097f']+")
+
+# Speech-to-text and mobile keyboards send typographic apostrophes ("don’t").
+_APOSTROPHES = str.maketrans({"\u2018": "'", "\u2019": "'", "\u02bc": "'"})
+
+# Phrases that confirm wherever they appear in a message.
+CONFIRM_PHRASES = (
+    # English
+    "submit it", "finalize", "finalise", "go ahead",
+    "looks good", "all good", "that's correct", "that is correct", "that's right", "that is right",
+    "yes please", "sounds good", "please submit", "send it",
+    # Hindi (Devanagari and romanized)
+    "सबमिट करो", "सबमिट कर दो", "सबमिट कीजिए", "सबमिट करें", "ठीक है", "हाँ ठीक है",
+    "कर दो", "जमा करो", "theek hai", "thik hai", "haan theek hai", "ok hai", "kar do", "as it is",
+    # Marathi (Devanagari and romanized)
+    "ठीक आहे", "सबमिट करा", "करून टाका", "बरोबर आहे", "theek aahe", "karun taka", "submit kara",
+    "barobar aahe",
+)
+
+# Words that are ambiguous inside longer sentences ("ho" is Marathi "yes" but
+# also Hindi "be"; "I want to submit another idea"), so they only count in a
+# short reply made up entirely of these and filler words.
+SHORT_AFFIRMATIVES = frozenset((
+    "yes", "yeah", "yep", "ok", "okay", "correct", "right", "sure", "fine", "done", "perfect",
+    "submit", "confirm", "confirmed", "सबमिट",
+    "हाँ", "हां", "haan", "han", "ठीक", "theek", "thik", "चलेगा", "chalega",
+    "हो", "ho", "बरोबर", "barobar", "चालेल", "chalel",
+))
+SHORT_REPLY_FILLER = frozenset((
+    "please", "it", "it's", "its", "is", "that's", "thats", "fine", "thank", "thanks", "you",
+    "ji", "जी", "hai", "है", "ना", "na", "आहे", "aahe", "dhanyavad", "धन्यवाद",
+))
+SHORT_REPLY_MAX_TOKENS = 5
+
+# Any of these turns the message into a refusal or a deferral.
+NEGATIONS = (
+    "no", "not", "don't", "dont", "do not", "never", "wait", "hold on", "cancel", "stop", "change",
+    "नहीं", "नही", "मत", "रुको", "रुकिए", "बदलो", "nahi", "nahin", "mat", "ruko",
+    "नको", "नका", "नाही", "थांबा", "बदला", "nako", "naka", "thamba",
+)
+# Idioms that contain a negation word but still agree ("sure, why not"). They
+# cancel the negation, and in a short reply they are a confirmation on their own.
+AFFIRMATIVE_IDIOMS = (
+    "no problem", "no issues", "no issue", "no worries", "why not",
+    "कोई बात नहीं", "कोई दिक्कत नहीं", "क्यों नहीं", "koi baat nahi", "koi dikkat nahi", "kyon nahi",
+    "हरकत नाही", "काही हरकत नाही", "harkat nahi", "kahi harkat nahi",
+)
+
+
+def normalize(message):
+    """NFKC + casefold, punctuation (including the danda) dropped, tokens joined by single spaces."""
+    message = message or ""
+    if not message.isascii():
+        message = unicodedata.normalize("NFKC", message).translate(_APOSTROPHES)
+    return " ".join(_TOKEN.findall(message.casefold()))
+
+
+def _phrase_pattern(phrases):
+    # Phrases are matched as whole token sequences of the normalized text;
+    # longest first so "सबमिट कर दो" wins over "कर दो".
+    alternatives = sorted({normalize(p) for p in phrases}, key=len, reverse=True)
+    return re.compile(r"(?<!\S)(?:" + "|".join(map(re.escape, alternatives)) + r")(?!\S)")
+
+
+_CONFIRM = _phrase_pattern(CONFIRM_PHRASES)
+_NEGATION = _phrase_pattern(NEGATIONS)
+_IDIOMS = _phrase_pattern(AFFIRMATIVE_IDIOMS)
+
+
+def is_confirmation(message):
+    """
+    True when a user utterance (English, Hindi or Marathi) asks to go ahead
+    and submit. Questions and utterances with a negation ("don't submit",
+    "नहीं", "नको") are not confirmations.
+    """
+    if (message or "").rstrip().endswith("?"):
+        return False
+    text = normalize(message)
+    if not text:
+        return False
+    # Every idiom contains a negation word, so only strip idioms when one matched.
+    idiom = _NEGATION.search(text) and _IDIOMS.search(text)
+    rest = _IDIOMS.sub(" ", text) if idiom else text
+    if _NEGATION.search(rest):
+        return False
+    if _CONFIRM.search(text):
+        return True
+    if len(text.split(" ")) > SHORT_REPLY_MAX_TOKENS:
+        return False
+    tokens = rest.split()
+    agrees = idiom or not SHORT_AFFIRMATIVES.isdisjoint(tokens)
+    return bool(agrees) and all(t in SHORT_AFFIRMATIVES or t in SHORT_REPLY_FILLER for t in tokens)
@@ -5,23 +5,47 @@ from sqlalchemy import (
     Column,
     String,
     Integer,
+    BigInteger,
     Text,
     DateTime,
+    Date,
     ForeignKey,
     Boolean,
+    Index,
+    PrimaryKeyConstraint,
     func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 
 # Define metadata
 metadata = MetaData()
 
+# Full-text search vectors. Each field is indexed twice: 'english' (stemmed)
+# and 'simple' (exact tokens, which is what works for the Devanagari
+# Hindi/Marathi text the agent produces). Queries OR both configs.
+def _search_terms(column, weight):
+    return (
+        f"setweight(to_tsvector('english', coalesce({column}, '')), '{weight}') || "
+        f"setweight(to_tsvector('simple', coalesce({column}, '')), '{weight}')"
+    )
+
+IDEA_SEARCH_FIELDS = (("idea_title", "A"), ("explanation", "B"), ("expected_impact", "C"))
+MESSAGE_SEARCH_FIELDS = (("text_content", "D"),)
+
+
+def search_vector_sql(fields, row=""):
+    """tsvector expression over `fields`; `row` qualifies the columns (e.g. "NEW.")."""
+    return " || ".join(_search_terms(f"{row}{column}", weight) for column, weight in fields)
+
+
 # Define the 'users' table
 users = Table(
     'users',
     metadata,
     Column('id', String(100), primary_key=True),
     Column('username', String(100), unique=True, nullable=False),
-    Column('password', String(255), nullable=False),  # for demo; use hashes in production
+    Column('password', String(255), nullable=False),  # scrypt hash, see auth.py
     Column('created_at', DateTime(timezone=True), server_default=func.now())
 )
 
@@ -44,7 +68,8 @@ messages = Table(
     Column('role', String(50), nullable=False),
     Column('text_content', Text),
     Column('file_url', String(1024)),
-    Column('timestamp', DateTime(timezone=True), server_default=func.now())
+    Column('timestamp', DateTime(timezone=True), server_default=func.now()),
+    Column('search_vector', TSVECTOR),  # kept current by a trigger (migration 8)
 )
 
 # Define the 'curated_ideas' table
@@ -64,7 +89,107 @@ curated_ideas = Table(
     Column('submitted_at', DateTime(timezone=True), server_default=func.now()),
     Column('reviewed_at', DateTime(timezone=True)),
     Column('reviewer_notes', Text),
-    Column('approved' , Boolean, default=False)
+    Column('approved' , Boolean, default=False),
+    Column('search_vector', TSVECTOR),  # kept current by a trigger (migration 8)
+)
+
+# Secondary indexes for the hot request paths (applied by migration 3)
+ix_messages_session_timestamp = Index(
+    'ix_messages_session_timestamp',
+    messages.c.session_id, messages.c.timestamp,
+)
+# Partial index for attachment lookups (`file_url LIKE 'gs://%'` in /ideas)
+ix_messages_session_gcs_files = Index(
+    'ix_messages_session_gcs_files',
+    messages.c.session_id,
+    postgresql_where=text("file_url LIKE 'gs://%'"),
+)
+ix_sessions_created_by_created_at = Index(
+    'ix_sessions_created_by_created_at',
+    sessions.c.created_by, sessions.c.created_at.desc(),
+)
+ix_curated_ideas_session_submitted_at = Index(
+    'ix_curated_ideas_session_submitted_at',
+    curated_ideas.c.session_id, curated_ideas.c.submitted_at.desc(),
+)
+# Keyset order for GET /ideas pagination
+ix_curated_ideas_submitted_at_id = Index(
+    'ix_curated_ideas_submitted_at_id',
+    curated_ideas.c.submitted_at.desc(), curated_ideas.c.id.desc(),
+)
+
+ix_curated_ideas_search = Index(
+    'ix_curated_ideas_search', curated_ideas.c.search_vector, postgresql_using='gin',
+)
+ix_messages_search = Index(
+    'ix_messages_search', messages.c.search_vector, postgresql_using='gin',
+)
+
+hot_path_indexes = (
+    ix_messages_session_timestamp,
+    ix_messages_session_gcs_files,
+    ix_sessions_created_by_created_at,
+    ix_curated_ideas_session_submitted_at,
+    ix_curated_ideas_submitted_at_id,
+)
+
+# Define the 'idea_comparisons' table (durable tier of the /compare-ideas cache)
+idea_comparisons = Table(
+    'idea_comparisons',
+    metadata,
+    Column('cache_key', String(64), primary_key=True),  # sha256 of prompt version + both idea digests
+    Column('prompt_version', String(20), nullable=False),
+    Column('idea_a_id', Integer, ForeignKey('curated_ideas.id', ondelete='CASCADE')),
+    Column('idea_b_id', Integer, ForeignKey('curated_ideas.id', ondelete='CASCADE')),
+    Column('model', String(100)),
+    Column('comparison', Text, nullable=False),
+    Column('created_at', DateTime(timezone=True), server_default=func.now())
+)
+
+# Define the 'table_versions' table (change counters bumped by triggers; used for ETags)
+table_versions = Table(
+    'table_versions',
+    metadata,
+    Column('table_name', String(100), primary_key=True),
+    Column('version', BigInteger, nullable=False, server_default='0'),
+    Column('updated_at', DateTime(timezone=True), server_default=func.now())
+)
+
+# Define the 'schema_version' table (one row per applied migration, see migrations.py)
+schema_version = Table(
+    'schema_version',
+    metadata,
+    Column('version', Integer, primary_key=True),
+    Column('description', String(255), nullable=False),
+    Column('applied_at', DateTime(timezone=True), server_default=func.now())
+)
+
+# Define the 'idea_rollups' table: per-day idea counts maintained by the
+# curated_ideas triggers (migration 9). `day` is the UTC submission date and
+# an unknown submitter is stored as ''.
+idea_rollups = Table(
+    'idea_rollups',
+    metadata,
+    Column('day', Date, nullable=False),
+    Column('category', String(100), nullable=False),
+    Column('urgency', String(100), nullable=False),
+    Column('created_by', String(100), nullable=False),
+    Column('ideas', BigInteger, nullable=False, server_default='0'),
+    Column('approved', BigInteger, nullable=False, server_default='0'),
+    Column('reviewed', BigInteger, nullable=False, server_default='0'),
+    PrimaryKeyConstraint('day', 'category', 'urgency', 'created_by'),
+)
+
+# Define the 'session_summaries' table: rolling summary of the older part of a
+# session's transcript, used to bound the context restored on reconnect (history.py)
+session_summaries = Table(
+    'session_summaries',
+    metadata,
+    Column('session_id', String(255), ForeignKey('sessions.id', ondelete='CASCADE'), primary_key=True),
+    Column('summary', Text, nullable=False),
+    Column('summarized_through', Integer, nullable=False),  # messages.id of the last turn folded into the summary
+    Column('prompt_version', String(20), nullable=False),
+    Column('updated_at', DateTime(timezone=True), server_default=func.now())
 )
 
 # user aaccounts table and idea table 
@@ -0,0 +1,239 @@
+# duplicates.py
+import asyncio
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+from sqlalchemy import text
+
+from idea_events import RESYNC_EVENT
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64(0xFFFFFFFF)
+# Devanagari vowel signs are combining marks, which `\w` alone splits words on.
+_WORD = re.compile(r"[\w\u0900-\u097F]+")
+
+
+def shingles(text, k=4):
+    """Character k-grams of the case-folded words of `text`, joined by single spaces."""
+    joined = " ".join(_WORD.findall(unicodedata.normalize("NFKC", text or "").casefold()))
+    if len(joined) <= k:
+        return {joined} if joined else set()
+    return {joined[i:i + k] for i in range(len(joined) - k + 1)}
+
+
+class DuplicateIndex:
+    """
+    In-process MinHash + LSH index over curated idea title and explanation.
+
+    Each idea gets a `num_perm` MinHash signature, split into `bands` bands.
+    Ideas sharing any band hash are candidates, whose similarity (the estimated
+    Jaccard similarity of their shingles) is then checked against `threshold`.
+    Band hashes live in sorted numpy arrays, so a lookup is one binary search
+    per band, plus a scan of at most `merge_every` recent additions that have
+    not been merged in yet. Memory is roughly (4 * num_perm + 12 * bands) bytes
+    per idea.
+
+    Matching is on surface text, so an idea restated in another language is
+    only found when it shares enough (e.g. transliterated) wording.
+    """
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.6, seed=1, merge_every=1024,
+                 batch_size=2000, retry_seconds=30):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.threshold = threshold
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, 1 << 63, size=num_perm // bands, dtype=np.uint64) | np.uint64(1)
+        self._merge_every = merge_every
+        self._batch_size = batch_size
+        self._retry_seconds = retry_seconds
+
+        self._signatures = np.zeros((1024, num_perm), dtype=np.uint32)  # grown by doubling
+        self._ids = []          # row -> idea id
+        self._rows = {}         # idea id -> row
+        self._band_keys = [np.zeros(0, dtype=np.uint64) for _ in range(bands)]
+        self._band_rows = [np.zeros(0, dtype=np.int64) for _ in range(bands)]
+        self._pending = []      # [(keys (n, bands), rows (n,))] not yet merged
+        self._pending_rows = 0
+        self._loaded_through = 0  # highest id read from the database
+        self._task = None
+        self.ready = False
+        self.lookups = 0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, idea_id):
+        return idea_id in self._rows
+
+    def signature(self, idea_title, explanation):
+        """MinHash signature (uint32[num_perm]) of an idea, or None if it has no text."""
+        grams = shingles(f"{idea_title or ''} {explanation or ''}")
+        if not grams:
+            return None
+        hashes = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams))
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def signature_of(self, idea_id):
+        row = self._rows.get(idea_id)
+        return None if row is None else self._signatures[row]
+
+    def _keys(self, signatures):
+        """Band hashes, shape (n, bands), for signatures of shape (n, num_perm)."""
+        rows = signatures.reshape(len(signatures), self.bands, -1).astype(np.uint64)
+        return (rows * self._band_mix).sum(axis=2, dtype=np.uint64)
+
+    def add_many(self, idea_ids, signatures):
+        """Index ideas not already present. `signatures` has shape (n, num_perm)."""
+        fresh = [i for i, idea_id in enumerate(idea_ids) if idea_id not in self._rows]
+        if not fresh:
+            return
+        idea_ids = [idea_ids[i] for i in fresh]
+        signatures = np.asarray(signatures, dtype=np.uint32)[fresh]
+
+        first = len(self._ids)
+        needed = first + len(idea_ids)
+        if needed > len(self._signatures):
+            grown = np.zeros((max(needed, 2 * len(self._signatures)), self.num_perm), dtype=np.uint32)
+            grown[:first] = self._signatures[:first]
+            self._signatures = grown
+        self._signatures[first:needed] = signatures
+        for offset, idea_id in enumerate(idea_ids):
+            self._rows[idea_id] = first + offset
+            self._ids.append(idea_id)
+
+        self._pending.append((self._keys(signatures), np.arange(first, needed, dtype=np.int64)))
+        self._pending_rows += len(idea_ids)
+        # While the initial load runs, everything is merged once at the end.
+        if self.ready and self._pending_rows >= self._merge_every:
+            self._merge_pending()
+
+    def add(self, idea_id, signature):
+        if signature is not None:
+            self.add_many([idea_id], signature[np.newaxis, :])
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([k for k, _ in self._pending])
+        rows = np.concatenate([r for _, r in self._pending])
+        for band in range(self.bands):
+            order = np.argsort(keys[:, band], kind="stable")
+            band_keys, band_rows = keys[order, band], rows[order]
+            at = np.searchsorted(self._band_keys[band], band_keys, side="right")
+            self._band_keys[band] = np.insert(self._band_keys[band], at, band_keys)
+            self._band_rows[band] = np.insert(self._band_rows[band], at, band_rows)
+        self._pending = []
+        self._pending_rows = 0
+
+    def candidates(self, signature, threshold=None, limit=10, exclude=None):
+        """Indexed ideas similar to `signature`, as [(idea_id, similarity)] best first."""
+        if signature is None or not self._ids:
+            return []
+        self.lookups += 1
+        threshold = self.threshold if threshold is None else threshold
+        query = self._keys(signature[np.newaxis, :])[0]
+        rows = set()
+        for band, key in enumerate(query):
+            keys = self._band_keys[band]
+            lo = np.searchsorted(keys, key, side="left")
+            hi = np.searchsorted(keys, key, side="right")
+            rows.update(self._band_rows[band][lo:hi].tolist())
+        for keys, pending_rows in self._pending:
+            rows.update(pending_rows[(keys == query).any(axis=1)].tolist())
+        if exclude in self._rows:
+            rows.discard(self._rows[exclude])
+        if not rows:
+            return []
+
+        rows = np.fromiter(rows, dtype=np.int64, count=len(rows))
+        similarity = (self._signatures[rows] == signature).mean(axis=1)
+        keep = similarity >= threshold
+        rows, similarity = rows[keep], similarity[keep]
+        best = np.argsort(-similarity, kind="stable")[:limit]
+        return [(self._ids[rows[i]], round(float(similarity[i]), 3)) for i in best]
+
+    def _sign_rows(self, rows):
+        ids, signatures = [], []
+        for idea_id, idea_title, explanation in rows:
+            signature = self.signature(idea_title, explanation)
+            if signature is not None:
+                ids.append(idea_id)
+                signatures.append(signature)
+        return ids, np.array(signatures, dtype=np.uint32).reshape(len(ids), self.num_perm)
+
+    async def _load(self, engine, where="", params=None, advance=True):
+        """
+        Index curated_ideas rows matching `where`, signing each batch off the
+        event loop. With `advance`, remember the highest id read so a later
+        catch-up only reads newer rows.
+        """
+        loop = asyncio.get_running_loop()
+        async with engine.connect() as conn:
+            result = await conn.stream(
+                text(f"SELECT id, idea_title, explanation FROM curated_ideas {where} ORDER BY id"),
+                params or {},
+            )
+            async for partition in result.partitions(self._batch_size):
+                rows = [tuple(row) for row in partition]
+                ids, signatures = await loop.run_in_executor(None, self._sign_rows, rows)
+                self.add_many(ids, signatures)
+                if advance:
+                    self._loaded_through = max(self._loaded_through, rows[-1][0])
+
+    def start(self, engine, hub):
+        """Build the index from curated_ideas, then follow inserts published on `hub`."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(engine, hub))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, engine, hub):
+        # Subscribe before the initial load so inserts made meanwhile are not missed.
+        subscription = hub.subscribe()
+        try:
+            while not self.ready:
+                try:
+                    await self._load(engine, "WHERE id > :after", {"after": self._loaded_through})
+                    self._merge_pending()
+                    self.ready = True
+                    print(f"🧬 Duplicate index ready ({len(self)} ideas).")
+                except Exception as e:
+                    print(f"⚠️ Failed to build duplicate index: {e}")
+                    await asyncio.sleep(self._retry_seconds)
+            while True:
+                event = await subscription.get()
+                try:
+                    if event is RESYNC_EVENT or event.get("type") == "resync":
+                        await self._load(engine, "WHERE id > :after", {"after": self._loaded_through})
+                    elif event.get("type") == "insert":
+                        ids = [idea["id"] for idea in event.get("ideas", ())] or event.get("ids", [])
+                        missing = [idea_id for idea_id in ids if idea_id not in self._rows]
+                        if missing:
+                            await self._load(engine, "WHERE id = ANY(:ids)", {"ids": missing}, advance=False)
+                except Exception as e:
+                    print(f"⚠️ Failed to update duplicate index: {e}")
+        finally:
+            hub.unsubscribe(subscription)
+
+    def stats(self):
+        return {
+            "ready": self.ready,
+            "entries": len(self._ids),
+            "pending": self._pending_rows,
+            "lookups": self.lookups,
+        }
@@ -0,0 +1,176 @@
+# history.py
+import asyncio
+import logging
+import math
+
+from sqlalchemy import text
+
+from prompt import HISTORY_SUMMARY_PROMPT, HISTORY_SUMMARY_PROMPT_VERSION
+
+logger = logging.getLogger(__name__)
+
+# Per-message framing (role, separators) in the model's context.
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(content):
+    """
+    Rough token count without a tokenizer: ~4 characters per token for
+    Latin text, ~2 for Devanagari and other non-ASCII scripts.
+    """
+    content = content or ""
+    ascii_chars = sum(1 for ch in content if ch < "\x80")
+    return MESSAGE_OVERHEAD_TOKENS + math.ceil(ascii_chars / 4 + (len(content) - ascii_chars) / 2)
+
+
+def format_transcript(turns):
+    return "\n".join(f"{role}: {content}" for _, role, content in turns)
+
+
+class SessionHistory:
+    """
+    Token-budgeted transcript of one session for the realtime model.
+
+    The newest turns that fit in `recent_budget` tokens are restored verbatim.
+    Everything older is folded into a rolling summary stored in
+    session_summaries, together with the id of the last message it covers.
+    Turns are ordered by (timestamp, id), as in /session/<id>, and only turns
+    after that message are ever re-read. Folding runs in the background once
+    the unsummarized tail exceeds the budget by `fold_threshold` tokens. A
+    reconnect therefore restores at most the summary plus `recent_budget`
+    tokens, however long the session has run. At most `max_scan` unsummarized
+    turns are read. Earlier turns of an old, never-summarized session are
+    skipped rather than folded.
+    """
+
+    def __init__(self, engine, llm, session_id, recent_budget=2000, fold_threshold=2000,
+                 fold_chunk_tokens=6000, summary_max_words=250, max_scan=2000, restore_fold_timeout=8.0):
+        self._engine = engine
+        self._llm = llm
+        self.session_id = session_id
+        self.recent_budget = recent_budget
+        self.fold_threshold = fold_threshold
+        self.fold_chunk_tokens = fold_chunk_tokens
+        self.summary_max_words = summary_max_words
+        self.max_scan = max_scan
+        self.restore_fold_timeout = restore_fold_timeout
+        self._unsummarized_tokens = 0
+        self._fold_lock = asyncio.Lock()
+        self._fold_task = None
+
+    async def _read(self):
+        """Return (summary, summarized_through, unsummarized turns newest-first as (id, role, text))."""
+        async with self._engine.connect() as conn:
+            row = (await conn.execute(
+                text("SELECT summary, summarized_through FROM session_summaries WHERE session_id = :sid"),
+                {"sid": self.session_id},
+            )).one_or_none()
+            summary, through = (row[0], row[1]) if row else (None, 0)
+            result = await conn.execute(
+                text("""
+                    SELECT id, role, text_content FROM messages
+                    WHERE session_id = :sid
+                      AND (:through = 0 OR (timestamp, id) > (
+                          SELECT m.timestamp, m.id FROM messages m WHERE m.id = :through
+                      ))
+                      AND text_content IS NOT NULL AND text_content <> ''
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT :max_scan
+                """),
+                {"sid": self.session_id, "through": through, "max_scan": self.max_scan},
+            )
+            turns = [tuple(r) for r in result.all()]
+        return summary, through, turns
+
+    def _split(self, turns_newest_first):
+        """Split into (recent turns oldest-first, older turns oldest-first) by `recent_budget`."""
+        used = 0
+        cut = len(turns_newest_first)
+        for index, (_, _, content) in enumerate(turns_newest_first):
+            used += estimate_tokens(content)
+            if used > self.recent_budget and index > 0:
+                cut = index
+                break
+        recent = list(reversed(turns_newest_first[:cut]))
+        older = list(reversed(turns_newest_first[cut:]))
+        return recent, older
+
+    async def restore(self):
+        """
+        Return (summary or None, [(role, text), ...] oldest-first) for a reconnect.
+        Turns that fell out of the recent window but were never summarized are
+        folded first (bounded by `restore_fold_timeout`). If that fails they
+        are left out, so the restored context stays within budget.
+        """
+        summary, _, turns = await self._read()
+        recent, older = self._split(turns)
+        if older and self._llm.configured:
+            try:
+                await asyncio.wait_for(self.fold(), timeout=self.restore_fold_timeout)
+                summary, _, turns = await self._read()
+                recent, older = self._split(turns)
+            except Exception as e:
+                logger.warning("History fold during restore failed (session %s): %s", self.session_id, e)
+        if older:
+            logger.info("Restoring without %d unsummarized older turns (session %s).", len(older), self.session_id)
+        self._unsummarized_tokens = sum(estimate_tokens(t[2]) for t in recent)
+        return summary, [(role, content) for _, role, content in recent]
+
+    def note_message(self, content):
+        """Call after a message is persisted; schedules a background fold when due."""
+        self._unsummarized_tokens += estimate_tokens(content)
+        due = self._unsummarized_tokens > self.recent_budget + self.fold_threshold
+        if due and self._llm.configured and (self._fold_task is None or self._fold_task.done()):
+            self._fold_task = asyncio.create_task(self._fold_in_background())
+
+    async def _fold_in_background(self):
+        try:
+            await self.fold()
+        except Exception as e:
+            logger.warning("History fold failed (session %s): %s", self.session_id, e)
+
+    async def fold(self):
+        """Fold every turn older than the recent window into the stored summary."""
+        async with self._fold_lock:
+            summary, through, turns = await self._read()
+            recent, older = self._split(turns)
+            while older:
+                chunk, used = [], 0
+                while older and (not chunk or used + estimate_tokens(older[0][2]) <= self.fold_chunk_tokens):
+                    used += estimate_tokens(older[0][2])
+                    chunk.append(older.pop(0))
+                summary = (await self._llm.generate(HISTORY_SUMMARY_PROMPT.format(
+                    summary=summary or "(none)",
+                    transcript=format_transcript(chunk),
+                    max_words=self.summary_max_words,
+                ))).strip()
+                through = chunk[-1][0]
+                await self._store(summary, through)
+                logger.info("Folded %d turns into the summary of session %s.", len(chunk), self.session_id)
+            self._unsummarized_tokens = sum(estimate_tokens(t[2]) for t in recent)
+
+    async def _store(self, summary, through):
+        # Never move backwards if another worker folded further meanwhile.
+        async with self._engine.begin() as conn:
+            await conn.execute(
+                text("""
+                    INSERT INTO session_summaries (session_id, summary, summarized_through, prompt_version, updated_at)
+                    VALUES (:sid, :summary, :through, :version, NOW())
+                    ON CONFLICT (session_id) DO UPDATE SET
+                        summary = EXCLUDED.summary,
+                        summarized_through = EXCLUDED.summarized_through,
+                        prompt_version = EXCLUDED.prompt_version,
+                        updated_at = NOW()
+                    WHERE session_summaries.summarized_through < EXCLUDED.summarized_through
+                """),
+                {"sid": self.session_id, "summary": summary, "through": through,
+                 "version": HISTORY_SUMMARY_PROMPT_VERSION},
+            )
+
+    async def close(self):
+        if self._fold_task is not None and not self._fold_task.done():
+            self._fold_task.cancel()
+            try:
+                await self._fold_task
+            except asyncio.CancelledError:
+                pass
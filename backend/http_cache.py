@@ -0,0 +1,72 @@
+# http_cache.py
+import gzip
+import hashlib
+
+from sqlalchemy import select
+
+from db_schema import table_versions
+
+try:
+    import brotli
+except ImportError:  # optional; gzip is always available
+    brotli = None
+
+# Suffixes appended to a strong ETag when the body is re-encoded (see compress_body).
+ENCODING_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+
+async def read_table_versions(engine, tables):
+    """Return the change counters (maintained by triggers) for `tables`, in order."""
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            select(table_versions.c.table_name, table_versions.c.version)
+            .where(table_versions.c.table_name.in_(tables))
+        )
+        versions = dict(result.all())
+    return [versions.get(table, 0) for table in tables]
+
+
+def make_etag(*parts):
+    """Strong ETag value (without quotes) derived from `parts`."""
+    return hashlib.sha1("\0".join(str(p) for p in parts).encode()).hexdigest()
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header names `etag` in any content encoding."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        candidate = candidate.removeprefix("W/").strip('"')
+        for suffix in ENCODING_SUFFIXES.values():
+            candidate = candidate.removesuffix(suffix)
+        if candidate == etag:
+            return True
+    return False
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported content coding from an Accept-Encoding header."""
+    offered = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip().lower()] = q
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
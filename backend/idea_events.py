@@ -0,0 +1,118 @@
+# idea_events.py
+import asyncio
+import json
+
+# Postgres channel fed by the curated_ideas triggers (migration 7).
+IDEA_EVENTS_CHANNEL = "idea_events"
+# Tells a client it may have missed events and should re-fetch /ideas.
+RESYNC_EVENT = {"type": "resync"}
+
+
+class Subscription:
+    """A bounded per-client event queue that collapses overflow into one `resync` event."""
+
+    def __init__(self, size):
+        self._queue = asyncio.Queue(maxsize=size)
+        self._overflowed = False
+
+    def push(self, event):
+        if self._overflowed:
+            return
+        if self._queue.full():
+            self._overflowed = True
+            self._queue.get_nowait()
+            self._queue.put_nowait(RESYNC_EVENT)
+            return
+        self._queue.put_nowait(event)
+
+    async def get(self):
+        event = await self._queue.get()
+        if event is RESYNC_EVENT:
+            self._overflowed = False
+        return event
+
+
+class IdeaEventHub:
+    """
+    Fans out Postgres NOTIFY payloads about curated_ideas to in-process subscribers.
+
+    One dedicated connection per process LISTENs on IDEA_EVENTS_CHANNEL and is
+    re-established if it drops (subscribers then get a `resync` event).
+    """
+
+    def __init__(self, queue_size=100, keepalive_seconds=60, retry_seconds=5):
+        self._queue_size = queue_size
+        self._keepalive_seconds = keepalive_seconds
+        self._retry_seconds = retry_seconds
+        self._subscribers = set()
+        self._task = None
+        self._conn = None
+        self.listening = False
+
+    def start(self, connect):
+        """Begin listening. `connect` is an async factory returning an asyncpg connection."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(connect))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, connect):
+        while True:
+            try:
+                self._conn = await connect()
+                closed = asyncio.Event()
+                self._conn.add_termination_listener(lambda _: closed.set())
+                await self._conn.add_listener(IDEA_EVENTS_CHANNEL, self._on_notify)
+                self.listening = True
+                print(f"📡 Listening for {IDEA_EVENTS_CHANNEL} notifications.")
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=self._keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        await self._conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                await self._close()
+                raise
+            except Exception as e:
+                print(f"⚠️ {IDEA_EVENTS_CHANNEL} listener failed: {e}")
+            self.listening = False
+            await self._close()
+            self.publish(RESYNC_EVENT)
+            await asyncio.sleep(self._retry_seconds)
+
+    async def _close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None and not conn.is_closed():
+            try:
+                await conn.close(timeout=5)
+            except Exception:
+                conn.terminate()
+
+    def _on_notify(self, _conn, _pid, _channel, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        self.publish(event)
+
+    def publish(self, event):
+        for subscription in list(self._subscribers):
+            subscription.push(event)
+
+    def subscribe(self):
+        subscription = Subscription(self._queue_size)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def stats(self):
+        return {"listening": self.listening, "subscribers": len(self._subscribers)}
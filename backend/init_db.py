@@ -1,18 +1,19 @@
 # init_db.py
 import os
+import sys
 import asyncio
 from dotenv import load_dotenv
 from google.cloud.sql.connector import Connector, IPTypes
 from sqlalchemy.ext.asyncio import create_async_engine
 
-# Import the metadata object that holds your table definitions
-from db_schema import metadata
+# Migrations are built from the table definitions in db_schema.py
+from migrations import run_migrations
 
 # Load environment variables from .env file
 load_dotenv()
 
 async def create_tables():
-    """Connects to the database and creates tables based on the defined schema."""
+    """Connects to the database and applies any pending schema migrations."""
     print("🚀 Initializing database connection...")
     try:
         # --- Database Connection Logic (copied from your server.py) ---
@@ -34,13 +35,14 @@ async def create_tables():
             "postgresql+asyncpg://", async_creator=getconn
         )
 
-        # --- Table Creation Logic ---
-        print("🔄 Creating database tables if they don't exist...")
-        async with engine.begin() as conn:
-            # run_sync tells the async connection to run the synchronous create_all method
-            await conn.run_sync(metadata.create_all)
-        
-        print("✅ Tables 'sessions' and 'messages' created successfully (or already exist).")
+        # --- Migration Logic ---
+        print("🔄 Applying pending schema migrations...")
+        applied = await run_migrations(engine)
+
+        if applied:
+            print(f"✅ Applied migrations: {applied}")
+        else:
+            print("✅ Schema already up to date.")
 
         # --- Cleanup ---
         await engine.dispose()
@@ -48,7 +50,9 @@ async def create_tables():
 
     except Exception as e:
         print(f"❌ An error occurred during database initialization: {e}")
+        return False
+    return True
 
 if __name__ == "__main__":
-    # Run the asynchronous create_tables function
-    asyncio.run(create_tables())
+    # Run the asynchronous create_tables function; a failure exits non-zero so deploys stop.
+    sys.exit(0 if asyncio.run(create_tables()) else 1)
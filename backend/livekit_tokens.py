@@ -0,0 +1,68 @@
+# livekit_tokens.py
+import datetime
+import time
+from collections import OrderedDict
+
+from livekit import api
+
+
+class TokenMinter:
+    """
+    Mints LiveKit access tokens and caches them per (session_id, identity).
+
+    A cached JWT is handed out again until `refresh_margin` before it expires,
+    so reconnects to the same room cost no signing work.
+    """
+
+    def __init__(
+        self,
+        api_key,
+        api_secret,
+        ttl=datetime.timedelta(hours=6),
+        refresh_margin=datetime.timedelta(minutes=15),
+        max_entries=5000,
+    ):
+        self._api_key = api_key
+        self._api_secret = api_secret
+        self.ttl = ttl
+        self._reuse_for = (ttl - refresh_margin).total_seconds()
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # (session_id, identity) -> (token, expires_at, reuse_until)
+        self.hits = 0
+        self.misses = 0
+
+    def _grants(self, session_id):
+        return api.VideoGrants(
+            room_join=True,
+            room=session_id,
+            can_publish=True,
+            can_subscribe=True,
+            can_publish_data=True,
+        )
+
+    def mint(self, session_id, identity):
+        """Return (jwt, expires_at) for `identity` in room `session_id`."""
+        key = (session_id, identity)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+        self.misses += 1
+        expires_at = datetime.datetime.now(datetime.timezone.utc) + self.ttl
+        token = api.AccessToken(self._api_key, self._api_secret) \
+            .with_identity(identity) \
+            .with_name(identity) \
+            .with_ttl(self.ttl) \
+            .with_grants(self._grants(session_id)) \
+            .to_jwt()
+        self._entries[key] = (token, expires_at, now + self._reuse_for)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return token, expires_at
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
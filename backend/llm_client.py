@@ -0,0 +1,127 @@
+# llm_client.py
+import asyncio
+import time
+from contextlib import aclosing
+import google.generativeai as genai
+
+from metrics import GEMINI_CALL_SECONDS
+
+
+class LLMNotConfigured(RuntimeError):
+    """Raised when generation is requested before a model is configured."""
+
+
+class LLMClient:
+    """
+    Long-lived async wrapper around a Gemini GenerativeModel.
+
+    The model is built once (see `configure`) and shared by every request.
+    Generation never blocks the event loop: models exposing
+    `generate_content_async` are awaited directly, anything else is run on the
+    default executor. A semaphore caps concurrent calls and every call is
+    bounded by `timeout` seconds.
+    """
+
+    def __init__(self, model_name="gemini-2.5-flash", max_concurrency=4, timeout=60.0):
+        self.model_name = model_name
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._model = None
+
+    @property
+    def configured(self):
+        return self._model is not None
+
+    def configure(self, api_key):
+        """Configure the Gemini SDK and build the shared model. Returns False without a key."""
+        if not api_key:
+            return False
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(self.model_name)
+        return True
+
+    def set_model(self, model):
+        """
+        Swap in any object with `generate_content`/`generate_content_async` (e.g. a local fake).
+        For `stream`, those methods are called with `stream=True` and must return an
+        (async) iterable of chunks exposing `.text`.
+        """
+        self._model = model
+
+    async def _call(self, prompt):
+        generate_async = getattr(self._model, "generate_content_async", None)
+        if generate_async is not None:
+            return await generate_async(prompt)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._model.generate_content, prompt)
+
+    async def generate(self, prompt):
+        """Generate text for `prompt`. Raises LLMNotConfigured or asyncio.TimeoutError."""
+        if self._model is None:
+            raise LLMNotConfigured("Gemini API key not configured")
+        async with self._semaphore:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                response = await asyncio.wait_for(self._call(prompt), timeout=self.timeout)
+                outcome = "ok"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise
+            finally:
+                GEMINI_CALL_SECONDS.labels("generate", outcome).observe(time.perf_counter() - started)
+        return response.text
+
+    async def stream(self, prompt):
+        """
+        Yield text chunks as they are generated. The concurrency slot is held
+        until the stream is exhausted or closed, and each chunk must arrive
+        within `timeout` seconds.
+        """
+        if self._model is None:
+            raise LLMNotConfigured("Gemini API key not configured")
+        async with self._semaphore:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                async with aclosing(self._stream(prompt)) as chunks:
+                    async for text in chunks:
+                        yield text
+                outcome = "ok"
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                raise
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = "cancelled"
+                raise
+            finally:
+                GEMINI_CALL_SECONDS.labels("stream", outcome).observe(time.perf_counter() - started)
+
+    async def _stream(self, prompt):
+        generate_async = getattr(self._model, "generate_content_async", None)
+        if generate_async is not None:
+            response = await asyncio.wait_for(generate_async(prompt, stream=True), timeout=self.timeout)
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.timeout)
+                except StopAsyncIteration:
+                    return
+                if chunk.text:
+                    yield chunk.text
+        else:
+            loop = asyncio.get_running_loop()
+            response = await asyncio.wait_for(
+                loop.run_in_executor(None, lambda: self._model.generate_content(prompt, stream=True)),
+                timeout=self.timeout,
+            )
+            chunks = iter(response)
+            done = object()
+            while True:
+                chunk = await asyncio.wait_for(
+                    loop.run_in_executor(None, next, chunks, done), timeout=self.timeout
+                )
+                if chunk is done:
+                    return
+                if chunk.text:
+                    yield chunk.text
@@ -0,0 +1,154 @@
+# metrics.py
+import re
+import time
+
+from prometheus_client import Gauge, Histogram
+from quart.wrappers.response import ResponseBody
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "roka_http_request_duration_seconds",
+    "Time to produce a response, per Quart route.",
+    ["method", "route", "status"],
+)
+HTTP_IN_FLIGHT = Gauge(
+    "roka_http_requests_in_flight",
+    "Requests currently being handled, per Quart route.",
+    ["route"],
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "roka_db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the SQLAlchemy pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "roka_db_pool_connections",
+    "SQLAlchemy pool state (size, checked_out, overflow).",
+    ["state"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "roka_db_query_duration_seconds",
+    "Statement execution time, labelled by operation and main table.",
+    ["statement"],
+)
+GCS_SIGN_SECONDS = Histogram(
+    "roka_gcs_sign_duration_seconds",
+    "Time to generate one GCS signed URL (including any IAM signBlob call).",
+)
+GEMINI_CALL_SECONDS = Histogram(
+    "roka_gemini_call_duration_seconds",
+    "Gemini call latency (full generation, or full stream for mode=stream).",
+    ["mode", "outcome"],
+    buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120),
+)
+CACHE_STATS = Gauge(
+    "roka_cache_stat",
+    "In-process cache counters (entries, hits, misses, ...) as reported by each cache's stats().",
+    ["cache", "stat"],
+)
+
+
+class RequestTimer:
+    """In-flight gauge and latency histogram for one request; `finish` records once."""
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.started = time.perf_counter()
+        self.finished = False
+        HTTP_IN_FLIGHT.labels(route).inc()
+
+    def finish(self, status):
+        if self.finished:
+            return
+        self.finished = True
+        HTTP_IN_FLIGHT.labels(self.route).dec()
+        HTTP_REQUEST_SECONDS.labels(self.method, self.route, status).observe(time.perf_counter() - self.started)
+
+
+class TimedBody(ResponseBody):
+    """
+    Wraps a streamed response body so the request is timed until the body is
+    closed (sent, failed or abandoned by the client), not until the view returns.
+    A body that raises while streaming is recorded as a 500.
+    """
+
+    def __init__(self, body, timer, status):
+        self._body = body
+        self._timer = timer
+        self._status = status
+        self._iterable = None
+
+    async def __aenter__(self):
+        self._iterable = await self._body.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        try:
+            return await self._body.__aexit__(exc_type, exc_value, tb)
+        finally:
+            self._timer.finish(500 if isinstance(exc_value, Exception) else self._status)
+
+    def __aiter__(self):
+        return self._iterable.__aiter__()
+
+
+def statement_label(statement):
+    """Reduce SQL to a low-cardinality 'operation table' label."""
+    head = statement.lstrip()[:12].upper()
+    if head.startswith("SELECT"):
+        match = re.search(r"\bFROM\s+([a-z_][a-z0-9_.]*)", statement, re.IGNORECASE)
+        return f"select {match.group(1).lower()}" if match else "select"
+    for operation, keyword in (("INSERT", "INTO"), ("UPDATE", "UPDATE"), ("DELETE", "FROM")):
+        if head.startswith(operation):
+            match = re.search(rf"\b{keyword}\s+([a-z_][a-z0-9_.]*)", statement, re.IGNORECASE)
+            return f"{operation.lower()} {match.group(1).lower()}" if match else operation.lower()
+    return head.split(" ", 1)[0].lower() or "other"
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+
+
+def instrument_engine(engine):
+    """Attach per-statement timing to an AsyncEngine."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        DB_QUERY_SECONDS.labels(statement_label(statement)).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_started"):
+            conn.info["query_started"].pop()
+
+
+def update_cache_gauges(caches):
+    """Publish {name: stats_dict} from the in-process caches."""
+    for name, stats in caches.items():
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)):
+                CACHE_STATS.labels(name, stat).set(value)
+
+
+def update_pool_gauges(engine):
+    """Refresh pool gauges; called right before each scrape."""
+    pool = engine.pool
+    DB_POOL_CONNECTIONS.labels("size").set(pool.size())
+    DB_POOL_CONNECTIONS.labels("checked_out").set(pool.checkedout())
+    DB_POOL_CONNECTIONS.labels("overflow").set(max(pool.overflow(), 0))
@@ -0,0 +1,437 @@
+# migrations.py
+from collections import namedtuple
+from sqlalchemy import select, text
+from sqlalchemy.schema import CreateIndex
+
+from auth import hash_password, is_password_hash
+from db_schema import (
+    metadata, schema_version, hot_path_indexes, idea_comparisons, users, table_versions,
+    IDEA_SEARCH_FIELDS, MESSAGE_SEARCH_FIELDS, search_vector_sql, ix_curated_ideas_search, ix_messages_search,
+    idea_rollups, session_summaries,
+)
+
+# Each step is either a SQL string or a callable run with a sync connection
+# (e.g. `metadata.create_all`). Steps must be idempotent so that a fresh
+# database, whose baseline already matches db_schema.py, can replay them,
+# and so that a migration interrupted between steps can simply be re-run.
+Migration = namedtuple("Migration", ["version", "description", "steps"])
+
+# A step that must not run inside a transaction (CREATE INDEX CONCURRENTLY).
+# `step` is a SQL string or a callable, run on an autocommit connection.
+OutsideTransaction = namedtuple("OutsideTransaction", ["step"])
+
+# A step that updates a large table in keyset batches of `batch_size` ids,
+# each committed on its own so writers are only blocked for one batch.
+# `update_sql` must update the rows with :after_id < id <= :last_id.
+Batched = namedtuple("Batched", ["table", "update_sql", "batch_size"])
+
+
+def create_tables(*tables):
+    """Step that creates each table unless it already exists."""
+    def step(sync_conn):
+        for table in tables:
+            table.create(sync_conn, checkfirst=True)
+    return step
+
+
+def create_index_concurrently(index):
+    """
+    Step that builds `index` without blocking writes. A build that failed
+    earlier leaves an INVALID index behind, which is dropped and rebuilt.
+    """
+    def step(sync_conn):
+        invalid = sync_conn.execute(
+            text("""
+                SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+                WHERE c.relname = :name AND NOT i.indisvalid
+            """),
+            {"name": index.name},
+        ).first()
+        if invalid:
+            sync_conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}"))
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=sync_conn.dialect))
+        sync_conn.execute(text(ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)))
+    return OutsideTransaction(step)
+
+
+def hash_plaintext_passwords(sync_conn):
+    """Replace any plaintext `users.password` values with scrypt hashes."""
+    rows = sync_conn.execute(select(users.c.id, users.c.password)).all()
+    for user_id, password in rows:
+        if not is_password_hash(password):
+            sync_conn.execute(
+                users.update().where(users.c.id == user_id).values(password=hash_password(password))
+            )
+
+
+# `messages` is not here: most message writes are plain transcript turns, and
+# no cached endpoint depends on them (see ATTACHMENT_VERSION_STEPS).
+VERSIONED_TABLES = ("sessions", "curated_ideas")
+
+
+def version_trigger_steps(tables):
+    """Steps installing a statement-level trigger that bumps table_versions for each table."""
+    steps = [
+        create_tables(table_versions),
+        """
+        CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE table_versions SET version = version + 1, updated_at = now()
+            WHERE table_name = TG_TABLE_NAME;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+    ]
+    for table in tables:
+        steps += [
+            f"INSERT INTO table_versions (table_name, version) VALUES ('{table}', 0) ON CONFLICT DO NOTHING",
+            f"DROP TRIGGER IF EXISTS trg_{table}_version ON {table}",
+            f"""
+            CREATE TRIGGER trg_{table}_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()
+            """,
+        ]
+    return steps
+
+
+ATTACHMENT_VERSION_STEPS = [
+    # /ideas only reads the gs:// attachment rows of messages. A statement
+    # trigger on every transcript turn would change its ETag on each turn, and
+    # would make all message writers queue on one table_versions row. These
+    # row triggers fire only for attachment rows.
+    "DROP TRIGGER IF EXISTS trg_messages_version ON messages",
+    "DELETE FROM table_versions WHERE table_name = 'messages'",
+    "INSERT INTO table_versions (table_name, version) VALUES ('attachments', 0) ON CONFLICT DO NOTHING",
+    """
+    CREATE OR REPLACE FUNCTION bump_attachment_version() RETURNS trigger AS $$
+    BEGIN
+        UPDATE table_versions SET version = version + 1, updated_at = now()
+        WHERE table_name = 'attachments';
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_messages_attachment_insert ON messages",
+    """
+    CREATE TRIGGER trg_messages_attachment_insert
+    AFTER INSERT ON messages
+    FOR EACH ROW WHEN (NEW.file_url LIKE 'gs://%')
+    EXECUTE FUNCTION bump_attachment_version()
+    """,
+    "DROP TRIGGER IF EXISTS trg_messages_attachment_update ON messages",
+    """
+    CREATE TRIGGER trg_messages_attachment_update
+    AFTER UPDATE OF file_url, session_id ON messages
+    FOR EACH ROW WHEN (NEW.file_url LIKE 'gs://%' OR OLD.file_url LIKE 'gs://%')
+    EXECUTE FUNCTION bump_attachment_version()
+    """,
+    "DROP TRIGGER IF EXISTS trg_messages_attachment_delete ON messages",
+    """
+    CREATE TRIGGER trg_messages_attachment_delete
+    AFTER DELETE ON messages
+    FOR EACH ROW WHEN (OLD.file_url LIKE 'gs://%')
+    EXECUTE FUNCTION bump_attachment_version()
+    """,
+    "DROP TRIGGER IF EXISTS trg_messages_attachment_truncate ON messages",
+    """
+    CREATE TRIGGER trg_messages_attachment_truncate
+    AFTER TRUNCATE ON messages
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_attachment_version()
+    """,
+]
+
+
+def search_vector_steps(table, fields):
+    """
+    Steps adding a trigger-maintained search_vector to `table`. Adding a
+    nullable column is a catalog-only change; a GENERATED ... STORED column
+    would rewrite the whole table under an exclusive lock instead. Existing
+    rows are backfilled in batches and the GIN index is built concurrently.
+    """
+    columns = ", ".join(column for column, _ in fields)
+    return [
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector",
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {search_vector_sql(fields, row="NEW.")};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """,
+        f"DROP TRIGGER IF EXISTS trg_{table}_search_vector ON {table}",
+        f"""
+        CREATE TRIGGER trg_{table}_search_vector
+        BEFORE INSERT OR UPDATE OF {columns} ON {table}
+        FOR EACH ROW EXECUTE FUNCTION {table}_search_vector()
+        """,
+        Batched(table, f"""
+            UPDATE {table} SET search_vector = {search_vector_sql(fields)}
+            WHERE id > :after_id AND id <= :last_id AND search_vector IS NULL
+        """, 5000),
+    ]
+
+
+IDEA_NOTIFY_STEPS = [
+    # One NOTIFY per statement, so bulk writes emit a single event. Payloads
+    # over the 8000-byte NOTIFY limit degrade to ids only, then to a resync.
+    """
+    CREATE OR REPLACE FUNCTION notify_idea_changes() RETURNS trigger AS $$
+    DECLARE
+        payload text;
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM changed_rows) THEN
+            RETURN NULL;
+        END IF;
+        SELECT json_build_object(
+            'type', lower(TG_OP),
+            'ideas', json_agg(json_build_object(
+                'id', id, 'session_id', session_id, 'created_by', created_by,
+                'idea_title', idea_title, 'category', category, 'urgency', urgency,
+                'approved', approved, 'submitted_at', submitted_at, 'reviewed_at', reviewed_at
+            ))
+        )::text INTO payload FROM changed_rows;
+        IF octet_length(payload) > 7900 THEN
+            SELECT json_build_object('type', lower(TG_OP), 'ids', json_agg(id))::text
+            INTO payload FROM changed_rows;
+        END IF;
+        IF octet_length(payload) > 7900 THEN
+            payload := '{"type": "resync"}';
+        END IF;
+        PERFORM pg_notify('idea_events', payload);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_notify_insert ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_notify_insert
+    AFTER INSERT ON curated_ideas REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_idea_changes()
+    """,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_notify_update ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_notify_update
+    AFTER UPDATE ON curated_ideas REFERENCING NEW TABLE AS changed_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_idea_changes()
+    """,
+]
+
+
+def rollup_upsert(rows_sql):
+    """
+    SQL adding the signed counts from `rows_sql` into idea_rollups. `rows_sql`
+    yields curated_ideas-shaped rows plus a `sign` column (+1 or -1).
+    `approved` only counts reviewed ideas: older rows can be approved without
+    a reviewed_at, and the API derives rejected as reviewed - approved.
+    """
+    return f"""
+        INSERT INTO idea_rollups AS r (day, category, urgency, created_by, ideas, approved, reviewed)
+        SELECT (submitted_at AT TIME ZONE 'UTC')::date, category, urgency, coalesce(created_by, ''),
+               sum(sign),
+               coalesce(sum(sign) FILTER (WHERE approved AND reviewed_at IS NOT NULL), 0),
+               coalesce(sum(sign) FILTER (WHERE reviewed_at IS NOT NULL), 0)
+        FROM ({rows_sql}) AS delta
+        GROUP BY 1, 2, 3, 4
+        HAVING sum(sign) <> 0
+            OR coalesce(sum(sign) FILTER (WHERE approved AND reviewed_at IS NOT NULL), 0) <> 0
+            OR coalesce(sum(sign) FILTER (WHERE reviewed_at IS NOT NULL), 0) <> 0
+        ON CONFLICT (day, category, urgency, created_by) DO UPDATE SET
+            ideas = r.ideas + EXCLUDED.ideas,
+            approved = r.approved + EXCLUDED.approved,
+            reviewed = r.reviewed + EXCLUDED.reviewed
+    """
+
+
+_ROLLUP_COLUMNS = "submitted_at, category, urgency, created_by, approved, reviewed_at"
+
+# Statement-level, so a bulk review touches each rollup row once. An UPDATE
+# subtracts the old rows and adds the new ones; groups that net to zero (e.g.
+# notes-only edits) are skipped by the HAVING clause.
+ROLLUP_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION rollup_idea_changes() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            {rollup_upsert(f"SELECT {_ROLLUP_COLUMNS}, 1 AS sign FROM new_rows")};
+        ELSIF TG_OP = 'UPDATE' THEN
+            {rollup_upsert(f"SELECT {_ROLLUP_COLUMNS}, 1 AS sign FROM new_rows "
+                           f"UNION ALL SELECT {_ROLLUP_COLUMNS}, -1 AS sign FROM old_rows")};
+        ELSIF TG_OP = 'DELETE' THEN
+            {rollup_upsert(f"SELECT {_ROLLUP_COLUMNS}, -1 AS sign FROM old_rows")};
+        ELSE
+            DELETE FROM idea_rollups;
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """
+
+# Rebuild from scratch. The caller must block writers to curated_ideas first,
+# so no idea is counted twice or missed.
+ROLLUP_BACKFILL_STEPS = [
+    "DELETE FROM idea_rollups",
+    rollup_upsert(f"SELECT {_ROLLUP_COLUMNS}, 1 AS sign FROM curated_ideas"),
+]
+
+IDEA_ROLLUP_STEPS = [
+    create_tables(idea_rollups),
+    ROLLUP_FUNCTION,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_rollup_insert ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_rollup_insert
+    AFTER INSERT ON curated_ideas REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_idea_changes()
+    """,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_rollup_update ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_rollup_update
+    AFTER UPDATE ON curated_ideas REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_idea_changes()
+    """,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_rollup_delete ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_rollup_delete
+    AFTER DELETE ON curated_ideas REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_idea_changes()
+    """,
+    "DROP TRIGGER IF EXISTS trg_curated_ideas_rollup_truncate ON curated_ideas",
+    """
+    CREATE TRIGGER trg_curated_ideas_rollup_truncate
+    AFTER TRUNCATE ON curated_ideas
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_idea_changes()
+    """,
+    # Creating the triggers above already took a lock that blocks writers.
+    *ROLLUP_BACKFILL_STEPS,
+]
+
+
+MIGRATIONS = (
+    Migration(1, "baseline tables from db_schema", [
+        metadata.create_all,
+    ]),
+    Migration(2, "ownership and approval columns", [
+        "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)",
+        "ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)",
+        "ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS approved boolean DEFAULT false",
+    ]),
+    Migration(3, "hot path indexes", [
+        *(create_index_concurrently(index) for index in hot_path_indexes),
+        "ANALYZE messages",
+        "ANALYZE sessions",
+        "ANALYZE curated_ideas",
+    ]),
+    Migration(4, "idea comparison cache", [
+        create_tables(idea_comparisons),
+    ]),
+    Migration(5, "hash stored user passwords", [
+        hash_plaintext_passwords,
+    ]),
+    Migration(6, "per-table change versions", version_trigger_steps(VERSIONED_TABLES)),
+    Migration(7, "curated_ideas change notifications", IDEA_NOTIFY_STEPS),
+    Migration(8, "full-text search vectors", [
+        *search_vector_steps("curated_ideas", IDEA_SEARCH_FIELDS),
+        *search_vector_steps("messages", MESSAGE_SEARCH_FIELDS),
+        create_index_concurrently(ix_curated_ideas_search),
+        create_index_concurrently(ix_messages_search),
+    ]),
+    Migration(9, "idea analytics rollups", IDEA_ROLLUP_STEPS),
+    Migration(10, "rolling session summaries", [
+        create_tables(session_summaries),
+    ]),
+    Migration(11, "attachment change version for /ideas", ATTACHMENT_VERSION_STEPS),
+    Migration(12, "count only reviewed approvals in idea rollups", [
+        "LOCK TABLE curated_ideas IN SHARE ROW EXCLUSIVE MODE",
+        ROLLUP_FUNCTION,
+        *ROLLUP_BACKFILL_STEPS,
+    ]),
+    # History restore reads (session_id, timestamp) order, like /session/<id>.
+    Migration(13, "drop redundant messages session index", [
+        OutsideTransaction("DROP INDEX CONCURRENTLY IF EXISTS ix_messages_session_id"),
+    ]),
+)
+
+# Serializes concurrent runners (several Cloud Run instances booting at once).
+MIGRATION_LOCK_KEY = 7210451
+
+
+def record_version(migration):
+    def step(sync_conn):
+        sync_conn.execute(
+            schema_version.insert().values(version=migration.version, description=migration.description)
+        )
+    return step
+
+
+async def _run_in_transaction(engine, steps):
+    async with engine.begin() as conn:
+        for step in steps:
+            if callable(step):
+                await conn.run_sync(step)
+            else:
+                await conn.execute(text(step))
+
+
+async def _run_outside_transaction(engine, step):
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if callable(step):
+            await conn.run_sync(step)
+        else:
+            await conn.execute(text(step))
+
+
+async def _run_batched(engine, batched):
+    after_id = 0
+    while True:
+        async with engine.begin() as conn:
+            last_id = (await conn.execute(
+                text(f"SELECT max(id) FROM (SELECT id FROM {batched.table} WHERE id > :after_id "
+                     f"ORDER BY id LIMIT :batch_size) AS batch"),
+                {"after_id": after_id, "batch_size": batched.batch_size},
+            )).scalar()
+            if last_id is None:
+                return
+            await conn.execute(text(batched.update_sql), {"after_id": after_id, "last_id": last_id})
+        after_id = last_id
+
+
+async def run_migrations(engine):
+    """
+    Apply every pending migration. Returns the versions applied.
+
+    A session-level advisory lock serializes runners. Consecutive plain steps
+    of a migration share one transaction; OutsideTransaction and Batched steps
+    commit on their own, so long index builds and backfills never hold a
+    transaction (and its locks) open. A migration's version is recorded with
+    its last transactional steps, or on its own if it has none.
+    """
+    applied = []
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(schema_version.create, checkfirst=True)
+                current = (await conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version"))).scalar()
+            for migration in MIGRATIONS:
+                if migration.version <= current:
+                    continue
+                pending = []
+                for step in migration.steps:
+                    if isinstance(step, (OutsideTransaction, Batched)):
+                        if pending:
+                            await _run_in_transaction(engine, pending)
+                            pending = []
+                        if isinstance(step, Batched):
+                            await _run_batched(engine, step)
+                        else:
+                            await _run_outside_transaction(engine, step.step)
+                    else:
+                        pending.append(step)
+                await _run_in_transaction(engine, pending + [record_version(migration)])
+                applied.append(migration.version)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+    return applied
@@ -0,0 +1,79 @@
+# pagination.py
+import base64
+import datetime
+from email.utils import parsedate_to_datetime
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed pagination or filter query parameters."""
+
+
+def encode_cursor(timestamp, row_id):
+    """Encode a (timestamp, id) keyset position as an opaque URL-safe token."""
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Decode a token from `encode_cursor` back into (datetime, int)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().rsplit("|", 1)
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise InvalidQuery("cursor is invalid")
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Parse a `limit` query parameter, clamped to [1, maximum]."""
+    if value is None or value == "":
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise InvalidQuery("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def parse_id(value, name):
+    """Parse a positive integer row id query parameter."""
+    try:
+        row_id = int(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be an integer id")
+    if row_id < 1:
+        raise InvalidQuery(f"{name} must be an integer id")
+    return row_id
+
+
+def parse_bool(value, name):
+    """Parse a boolean query parameter ('true'/'false'/'1'/'0')."""
+    lowered = value.strip().lower()
+    if lowered in ("true", "1", "yes"):
+        return True
+    if lowered in ("false", "0", "no"):
+        return False
+    raise InvalidQuery(f"{name} must be true or false")
+
+
+def parse_timestamp(value, name):
+    """Parse an ISO-8601 or HTTP-date (as emitted by jsonify) query parameter."""
+    try:
+        return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        pass
+    try:
+        return parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        raise InvalidQuery(f"{name} must be an ISO-8601 or HTTP date")
+
+
+def parse_date(value, name):
+    """Parse a YYYY-MM-DD query parameter."""
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise InvalidQuery(f"{name} must be a YYYY-MM-DD date")
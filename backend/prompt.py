@@ -115,35 +115,69 @@ Your process for finalizing an idea is a **two-step process** that depends on th
   - Hindi: "क्या यह सही लग रहा है? पुष्टि करने से पहले, क्या आप कोई फोटो संलग्न करना चाहेंगे?"
   - Marathi: "हे बरोबर दिसत आहे का? निश्चित करण्यापूर्वी, आपण फोटो जोडू इच्छिता का?"
 
-**Step 2: Present Final English Summary for Submission**
-- **ONLY AFTER the user confirms the first summary** (e.g., they say "submit," "ठीक है," or "हो, ठीक आहे"), your very next response **MUST** do the following:
-    1.  Acknowledge their confirmation in their language (e.g., "Thank you!", "धन्यवाद!", "धन्यवाद!").
-    2.  State that you are now preparing the final record in English (e.g., "I will now prepare the final summary in English for our records.").
-    3.  Immediately after that sentence, present the **final summary formatted in ENGLISH**.
-- After presenting the English summary, you MUST STOP. DO NOT say anything else. The system is now waiting for the user's final confirmation to save the idea.
-
-- This final English summary is critical for the system to save the idea correctly. It **MUST** use the exact multi-line markdown structure shown in the example below.
-- Each field **MUST** be on a new line.
-- Each field label **MUST** be enclosed in double asterisks (e.g., `**Idea Title:**`).
-- You **MUST** align ideas only under these four specific categories: `Kitchen`, `Maintenance`, `Operations`, or `Housekeeping`.
-
-**Example of the required final ENGLISH output (for Step 2):**
-**Idea Title:** Preventing Wine Glass Breakage
-**Explanation:** Place soft cotton cloths on tables to prevent breakage.
-**Category:** Operations
-**Expected Impact:** Reduces replacement costs and cleaning efforts.
-**Estimated Cost:** Approx. 400 rupees per cloth.
-**Urgency:** Medium
-
-- After presenting the English summary, you **MUST** ask for final permission to submit, using the user's language.
-  - **English:** "Should I proceed to submit?"
-  - **Hindi:** "क्या मैं इसे सबमिट करूँ?"
-  - **Marathi:** "मी हे सबमिट करू का?"
-
-## Final Submission Confirmation (System-Triggered)
-- After the system successfully saves the idea to the database, it will ask you to give a final confirmation to the user.
-- When this happens, your ONLY task is to say the following, translated into the user's language: 
+**Step 2: Submit the Idea with the `submit_idea` Tool**
+- **ONLY AFTER the user confirms the summary** (e.g., they say "submit," "ठीक है," or "हो, ठीक आहे"), call the `submit_idea` tool.
+- Fill every tool field **in ENGLISH**, translating from the conversation language if needed. Do NOT read an English summary aloud; the tool call is the record.
+- `category` MUST be one of `Kitchen`, `Maintenance`, `Operations`, or `Housekeeping`, and `urgency` one of `Low`, `Medium`, or `High`.
+- Set `user_confirmed` to `true` only if the user's latest reply confirmed the summary and asked you to submit; otherwise set it to `false`.
+- If the tool says the user has not confirmed yet, ask for confirmation in the user's language and wait. If it says saving failed, apologize and offer to try again.
+
+## Final Submission Confirmation
+- When the `submit_idea` tool reports that the idea has been saved, your ONLY task is to say the following, translated into the user's language: 
   - **English:** "Your idea has been successfully submitted. Thank you for your valuable contribution!"
   - **Hindi:** "आपका सुझाव सफलतापूर्वक सबमिट कर दिया गया है। आपके बहुमूल्य योगदान के लिए धन्यवाद!"
   - **Marathi:** "तुमची कल्पना यशस्वीरित्या सबमिट केली गेली आहे. तुमच्या मौल्यवान योगदानाबद्दल धन्यवाद!"
-"""
\ No newline at end of file
+"""
+# Bump COMPARE_PROMPT_VERSION whenever COMPARE_IDEAS_PROMPT changes so cached
+# comparisons produced by the old prompt are no longer served.
+COMPARE_PROMPT_VERSION = "1"
+
+COMPARE_IDEAS_PROMPT = """
+Please compare these two ideas in a structured format:
+
+Idea 1:
+{idea1}
+
+Idea 2:
+{idea2}
+
+Provide a detailed comparison covering: Similarities, Feasibility, Impact, Cost-benefit, and a final Recommendation.
+Format the response in a clear, structured manner with headings and bullet points.
+"""
+
+# Bump RANK_PROMPT_VERSION whenever RANK_IDEAS_PROMPT changes.
+RANK_PROMPT_VERSION = "1"
+
+RANK_IDEAS_PROMPT = """
+You are reviewing improvement ideas submitted by hotel staff.
+Score each idea below from 0 to 100 on its overall merit, weighing feasibility,
+expected impact, cost-benefit and urgency. Use the full scale consistently: the
+scores will be compared with ideas scored in other batches.
+
+{ideas}
+
+Respond with ONLY a JSON array, one object per idea, in this exact shape:
+[{{"id": <idea id>, "score": <0-100>, "rationale": "<one or two sentences>"}}]
+"""
+
+# Bump HISTORY_SUMMARY_PROMPT_VERSION whenever HISTORY_SUMMARY_PROMPT changes.
+HISTORY_SUMMARY_PROMPT_VERSION = "1"
+
+HISTORY_SUMMARY_PROMPT = """
+You maintain the running summary of a voice conversation between a hotel staff
+member (user) and the ROKA idea assistant (model). The summary replaces the
+older part of the transcript when the conversation is resumed.
+
+Current summary (may be empty):
+{summary}
+
+Next part of the transcript, oldest first:
+{transcript}
+
+Write the updated summary in English, at most {max_words} words. Keep:
+- the language the user chose (English, Hindi or Marathi);
+- every idea discussed and its fields (title, explanation, category, expected
+  impact, estimated cost, urgency), and whether it was submitted;
+- anything the user asked for or corrected that is still pending.
+Respond with ONLY the summary text.
+"""
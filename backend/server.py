@@ -1,52 +1,177 @@
 import os
 import uuid
+import asyncio
 import datetime
-from quart import Quart, request, jsonify,Blueprint
+import time
+from quart import Quart, Response, g, make_response, request, jsonify,Blueprint
+from quart.wrappers.response import DataBody, ResponseBody
 import traceback
+import asyncpg
+from contextlib import aclosing
 from dotenv import load_dotenv
 from quart_cors import cors
-from livekit import api
+from livekit_tokens import TokenMinter
 from google.cloud.sql.connector import Connector, IPTypes, create_async_connector
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy import text
-from db_schema import metadata
+from migrations import SchemaRegistry, run_migrations
+from auth import Authenticator, StreamTokenSigner, hash_password, verify_password
+from signed_urls import SignedUrlCache
+from idea_events import IdeaEventHub
+from duplicates import DuplicateIndex
+from http_cache import (
+    ENCODING_SUFFIXES, read_table_versions, make_etag, etag_matches, choose_encoding, compress_body,
+)
+from llm_client import LLMClient, LLMNotConfigured
+from metrics import (
+    RequestTimer, TimedBody, TimedAsyncQueuePool,
+    instrument_engine, update_pool_gauges, update_cache_gauges,
+)
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from comparisons import (
+    ComparisonCache, canonical_pair, build_comparison_prompt, payload_idea_id,
+    RANKING_PROMPT_VERSION, ranking_key, build_ranking_prompt, parse_ranking,
+)
+from pagination import (
+    InvalidQuery, encode_cursor, decode_cursor, parse_limit, parse_id, parse_bool, parse_timestamp, parse_date,
+)
 from google.cloud import storage
-import google.generativeai as genai
 from functools import wraps
 from google.auth import default
 
 load_dotenv()
 app = Quart(__name__)
-app = cors(app, allow_origin="*")
+app = cors(app, allow_origin="*", expose_headers=["X-Next-Cursor", "ETag"])
 
 # --- Google Cloud Storage Setup ---
 storage_client = storage.Client()
 BUCKET_NAME = os.getenv("BUCKET_NAME")
+signed_urls = SignedUrlCache(
+    storage_client,
+    max_entries=int(os.getenv("SIGNED_URL_CACHE_SIZE", "10000")),
+    max_workers=int(os.getenv("SIGNED_URL_WORKERS", "16")),
+)
+
+# --- Shared Gemini client (configured at startup) ---
+llm = LLMClient(
+    model_name=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"),
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", "4")),
+    timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60")),
+)
+comparison_cache = ComparisonCache(max_entries=int(os.getenv("COMPARISON_CACHE_SIZE", "1000")))
+
+# --- LiveKit token cache ---
+token_minter = TokenMinter(
+    os.getenv("LIVEKIT_API_KEY"),
+    os.getenv("LIVEKIT_API_SECRET"),
+    ttl=datetime.timedelta(seconds=int(os.getenv("LIVEKIT_TOKEN_TTL_SECONDS", "21600"))),
+    refresh_margin=datetime.timedelta(seconds=int(os.getenv("LIVEKIT_TOKEN_REFRESH_MARGIN_SECONDS", "900"))),
+)
 
 # --- Global Database Engine (Initialized at startup) ---
 engine = None
 connector = None
+schema = SchemaRegistry()
+idea_events = IdeaEventHub()
+duplicate_index = DuplicateIndex(threshold=float(os.getenv("DUPLICATE_THRESHOLD", "0.6")))
+
+ADMIN_USERNAME = os.getenv("ADMIN_USERNAME", "admin")
+ADMIN_PASSWORD = os.getenv("ADMIN_PASSWORD", "password@123")
+
+# Seeded into `users` (hashed) when missing; existing rows are never overwritten,
+# except that an explicitly set ADMIN_PASSWORD replaces the admin's hash.
+DEMO_USERS = (
+    ("admin", ADMIN_USERNAME, ADMIN_PASSWORD),
+    ("ketan", "Ketan", "ketan123"),
+    ("shraddha", "shraddha", "shraddha123"),
+)
+
+authenticator = Authenticator(
+    max_entries=int(os.getenv("AUTH_CACHE_SIZE", "1024")),
+    verified_ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300")),
+)
 
-HARDCODED_USERNAME = "admin"
-HARDCODED_PASSWORD = "password@123"
+# EventSource cannot send an Authorization header, so /events/ideas also
+# accepts a short-lived token from POST /events/token in the query string.
+stream_tokens = StreamTokenSigner(
+    os.getenv("STREAM_TOKEN_SECRET"),
+    ttl=int(os.getenv("STREAM_TOKEN_TTL_SECONDS", "300")),
+)
+IDEA_EVENTS_SCOPE = "events/ideas"
+
+async def sync_admin_password():
+    """Re-hash the admin password when ADMIN_PASSWORD no longer matches the stored hash."""
+    async with engine.begin() as conn:
+        result = await conn.execute(text("SELECT password FROM users WHERE id = 'admin' FOR UPDATE"))
+        stored = result.scalar_one_or_none()
+        loop = asyncio.get_running_loop()
+        if stored is None or await loop.run_in_executor(None, verify_password, ADMIN_PASSWORD, stored):
+            return
+        await conn.execute(
+            text("UPDATE users SET password = :password WHERE id = 'admin'"),
+            {"password": hash_password(ADMIN_PASSWORD)},
+        )
+    print("🔑 Admin password updated from ADMIN_PASSWORD.")
 
 def require_auth(func):
-    """A decorator to protect routes with hardcoded basic auth."""
+    """A decorator to protect routes with basic auth checked against the users table."""
     @wraps(func)
     async def wrapper(*args, **kwargs):
+        # Without the users table the credentials cannot be checked; don't ask for new ones.
+        if not engine:
+            return jsonify({"error": "database_unavailable"}), 503
         auth = request.authorization
-        if not auth or \
-           auth.username != HARDCODED_USERNAME or \
-           auth.password != HARDCODED_PASSWORD:
+        user = await authenticator.authenticate(engine, auth.username, auth.password) if auth else None
+        if not user:
             return (
                 jsonify({"error": "Unauthorized access"}),
                 401,
                 {'WWW-Authenticate': 'Basic realm="Login Required"'}
             )
+        g.user = user
         return await func(*args, **kwargs)
     return wrapper
 
 
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# Signed image URLs are re-issued well within a day, so ETags of responses that
+# embed them also roll over every SIGNED_ETAG_WINDOW_SECONDS.
+SIGNED_ETAG_WINDOW_SECONDS = 3600
+
+def conditional_get(*tables, signed=False):
+    """
+    A decorator that answers If-None-Match with 304 when none of `tables` has
+    changed. The ETag is derived from the request path and query plus the
+    trigger-maintained change versions named `tables` in table_versions
+    (usually a table name; "attachments" counts gs:// message rows), so a
+    match skips the handler.
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not engine:
+                return await func(*args, **kwargs)
+            try:
+                versions = await read_table_versions(engine, tables)
+            except Exception as e:
+                print(f"⚠️ Failed to read table versions, skipping ETag: {e}")
+                return await func(*args, **kwargs)
+            parts = [request.full_path, *versions]
+            if signed:
+                parts.append(int(time.time() // SIGNED_ETAG_WINDOW_SECONDS))
+            etag = make_etag(*parts)
+            headers = {"ETag": f'"{etag}"', "Cache-Control": "private, no-cache"}
+            if etag_matches(request.headers.get("If-None-Match"), etag):
+                return Response(status=304, headers=headers)
+
+            response = await make_response(await func(*args, **kwargs))
+            if response.status_code == 200:
+                response.headers.update(headers)
+            return response
+        return wrapper
+    return decorator
+
+
 @app.before_serving
 async def startup():
     """
@@ -57,70 +182,78 @@ async def startup():
     
     uploads_dir = os.path.join(os.getcwd(), "uploads")
     os.makedirs(uploads_dir, exist_ok=True)
+
+    if not llm.configured:
+        if llm.configure(os.getenv("GEMINI_API_KEY")):
+            print(f"🤖 Gemini client ready ({llm.model_name}).")
+        else:
+            print("⚠️ GEMINI_API_KEY is not set. /compare-ideas will be unavailable.")
+    if not stream_tokens.shared:
+        print("⚠️ STREAM_TOKEN_SECRET is not set. /events/token tokens only work on this instance.")
     
     print("🔄 Initializing database connection pool...")
     try:
-        instance_connection_name = os.environ["CLOUD_SQL_CONNECTION_NAME"]
-        db_user = os.environ["DB_USER"]
-        db_pass = os.environ["DB_PASS"]
-        db_name = os.environ["DB_NAME"]
+        database_url = os.getenv("DATABASE_URL")
+        if database_url:
+            # Plain Postgres (local development, load tests) instead of Cloud SQL.
+            dsn = database_url.replace("postgresql+asyncpg://", "postgresql://", 1)
 
-        connector = await create_async_connector()
+            async def getconn():
+                return await asyncpg.connect(dsn)
+        else:
+            instance_connection_name = os.environ["CLOUD_SQL_CONNECTION_NAME"]
+            db_user = os.environ["DB_USER"]
+            db_pass = os.environ["DB_PASS"]
+            db_name = os.environ["DB_NAME"]
 
-        async def getconn():
-            conn = await connector.connect_async(
-                instance_connection_name, "asyncpg", user=db_user,
-                password=db_pass, db=db_name, ip_type=IPTypes.PUBLIC
-            )
-            return conn
+            connector = await create_async_connector()
+
+            async def getconn():
+                conn = await connector.connect_async(
+                    instance_connection_name, "asyncpg", user=db_user,
+                    password=db_pass, db=db_name, ip_type=IPTypes.PUBLIC
+                )
+                return conn
 
         engine = create_async_engine(
             "postgresql+asyncpg://", async_creator=getconn, echo=False,
+            poolclass=TimedAsyncQueuePool,
             pool_size=5, max_overflow=10, pool_pre_ping=True, pool_recycle=1800,
         )
+        instrument_engine(engine)
         
-        async with engine.begin() as conn:
-            await conn.execute(text("SELECT 1"))
-            await conn.run_sync(metadata.create_all)
-            try:
-                await conn.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)"))
-            except Exception:
-                pass
+        # Migrations normally run from init_db.py before a deploy; running them
+        # here would make every booting instance wait on index builds/backfills.
+        if os.getenv("RUN_MIGRATIONS_ON_STARTUP", "0") == "1":
             try:
-                await conn.execute(text("ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)"))
-            except Exception:
-                pass
-            try:
-                await conn.execute(text("ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS approved boolean DEFAULT false"))
-            except Exception:
-                pass
-        async with engine.connect() as conn:
-            await conn.execute(text("SELECT 1"))
-            try:
-                await conn.execute(text("DELETE FROM users WHERE id NOT IN ('ketan','shraddha')"))
-                await conn.execute(
-                    text(
-                        """
-                        INSERT INTO users (id, username, password)
-                        VALUES (:id, :username, :password)
-                        ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username, password = EXCLUDED.password
-                        """
-                    ),
-                    {"id": "ketan", "username": "Ketan", "password": "ketan123"},
-                )
-                await conn.execute(
-                    text(
-                        """
-                        INSERT INTO users (id, username, password)
-                        VALUES (:id, :username, :password)
-                        ON CONFLICT (id) DO UPDATE SET username = EXCLUDED.username, password = EXCLUDED.password
-                        """
-                    ),
-                    {"id": "shraddha", "username": "shraddha", "password": "shraddha123"},
-                )
-                print("👤 Seeded demo users: Ketan/ketan123, Shraddha/shraddha123")
-            except Exception as se:
-                print(f"⚠️ Failed to seed users: {se}")
+                applied = await run_migrations(engine)
+                if applied:
+                    print(f"🧱 Applied schema migrations: {applied}")
+            except Exception as me:
+                print(f"❌ Schema migrations failed; serving the existing schema: {me}")
+        # Always load the registry, so handlers see the schema that is really there.
+        await schema.refresh(engine)
+        print(f"🧱 Schema at version {schema.version}.")
+        idea_events.start(getconn)
+        duplicate_index.start(engine, idea_events)
+        try:
+            async with engine.begin() as conn:
+                for user_id, username, password in DEMO_USERS:
+                    await conn.execute(
+                        text(
+                            """
+                            INSERT INTO users (id, username, password)
+                            VALUES (:id, :username, :password)
+                            ON CONFLICT (id) DO NOTHING
+                            """
+                        ),
+                        {"id": user_id, "username": username, "password": hash_password(password)},
+                    )
+            print(f"👤 Seeded demo users (if missing): {', '.join(u[1] for u in DEMO_USERS)}")
+            if os.getenv("ADMIN_PASSWORD"):
+                await sync_admin_password()
+        except Exception as se:
+            print(f"⚠️ Failed to seed users: {se}")
         
         print("✅ Database connection pool ready.")
     except Exception as e:
@@ -128,23 +261,80 @@ async def startup():
 
     print("✅ Server ready!")
 
+def route_label():
+    """Low-cardinality route name for metrics (the URL rule, not the raw path)."""
+    return request.url_rule.rule if request.url_rule else "unmatched"
+
+@app.before_request
+async def start_request_timer():
+    g.request_timer = RequestTimer(request.method, route_label())
+
+# Registered before compress_response, so it runs after it and sees the final body.
+@app.after_request
+async def record_request_metrics(response):
+    timer = g.pop("request_timer", None)
+    if timer is None:
+        return response
+    if not isinstance(response.response, ResponseBody) or isinstance(response.response, DataBody):
+        timer.finish(response.status_code)
+    else:
+        # Streamed and SSE bodies are sent after the request context is gone;
+        # stop the clock when the body is closed.
+        response.response = TimedBody(response.response, timer, response.status_code)
+    return response
+
+@app.teardown_request
+async def finish_request_metrics(exc):
+    # Still pending only if no response was finalized: the request raised.
+    timer = g.pop("request_timer", None)
+    if timer is not None:
+        timer.finish(500)
+
+@app.after_request
+async def compress_response(response):
+    """gzip/brotli-compress buffered responses above COMPRESS_MIN_BYTES."""
+    if (
+        response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or not isinstance(response.response, DataBody)
+    ):
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+    data = await response.get_data(as_text=False)
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    loop = asyncio.get_running_loop()
+    response.set_data(await loop.run_in_executor(None, compress_body, data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    etag = response.headers.get("ETag")
+    if etag:
+        response.headers["ETag"] = f'{etag[:-1]}{ENCODING_SUFFIXES[encoding]}"'
+    return response
+
 @app.after_serving
 async def shutdown():
     """Cleanup resources on shutdown."""
     global engine, connector
     print("🔌 Shutting down...")
+    await duplicate_index.stop()
+    await idea_events.stop()
     if engine:
         print("    - Disposing database engine.")
         await engine.dispose()
     if connector:
         print("    - Closing database connector.")
         await connector.close_async()
+    signed_urls.close()
     print("❌ Server shutdown complete")
 
 @app.route("/login", methods=["POST"])
 async def login():
     """
-    Validates credentials against the hardcoded admin username and password.
+    Validates credentials against the users table.
     """
     if not request.is_json:
         return jsonify({"error": "Request must be JSON"}), 415
@@ -155,45 +345,34 @@ async def login():
 
     if not username or not password:
         return jsonify({"error": "Username and password are required"}), 400
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
 
-    if username == HARDCODED_USERNAME and password == HARDCODED_PASSWORD:
+    user = await authenticator.authenticate(engine, username, password)
+    if user:
         return jsonify({
             "message": "Login successful",
-            "user": {
-                "id": "admin",
-                "username": "admin"
-            }
+            "user": user
         }), 200
     else:
         return jsonify({"error": "Invalid username or password"}), 401
 
 @app.route("/sessions", methods=["GET"])
 @require_auth
+@conditional_get("sessions")
 async def list_sessions():
     """List sessions for a specific user."""
     user_id = request.args.get("user_id")
     if not user_id:
         return jsonify({"error": "user_id is required"}), 400
+    # Never fall back to an unscoped listing: that would return every user's sessions.
+    if not schema.has_column("sessions", "created_by"):
+        return jsonify({"error": "schema_unavailable"}), 503
     async with engine.connect() as conn:
-        try:
-            chk = await conn.execute(
-                text("""
-                    SELECT 1 FROM information_schema.columns 
-                    WHERE table_name='sessions' AND column_name='created_by'
-                """)
-            )
-            has_created_by = chk.scalar() is not None
-        except Exception:
-            has_created_by = False
-
-        if has_created_by:
-            result = await conn.execute(
-                text("SELECT id, name FROM sessions WHERE created_by = :u ORDER BY created_at DESC"),
-                {"u": user_id}
-            )
-        else:
-            result = await conn.execute(text("SELECT id, name FROM sessions ORDER BY created_at DESC"))
-
+        result = await conn.execute(
+            text("SELECT id, name FROM sessions WHERE created_by = :u ORDER BY created_at DESC"),
+            {"u": user_id}
+        )
         sessions = result.mappings().all()
         return jsonify([dict(row) for row in sessions])
 
@@ -208,10 +387,6 @@ async def create_session():
     session_id = "Idea-" + str(uuid.uuid4())[:3]
     session_name = f"{user_id}-{session_id}"
     async with engine.begin() as conn:
-        try:
-            await conn.execute(text("ALTER TABLE sessions ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)"))
-        except Exception:
-            pass
         await conn.execute(
             text("INSERT INTO sessions (id, name, created_by) VALUES (:id, :name, :created_by)"),
             {"id": session_id, "name": session_name, "created_by": user_id}
@@ -234,47 +409,90 @@ async def get_session_details(session_id):
             return jsonify({"error": "Session not found"}), 404
 
 # --- START OF THE CRITICAL BACKEND FIX ---
+HISTORY_STREAM_BATCH = 100
+HISTORY_MAX_LIMIT = 10000
+
+
 @app.route("/session/<session_id>", methods=["GET"])
 @require_auth
 async def get_session_history(session_id):
-    """Get message history, converting GCS URIs to public URLs for previews."""
-    async with engine.connect() as conn:
-        result = await conn.execute(
-            text("SELECT role, text_content, file_url, timestamp FROM messages WHERE session_id = :id ORDER BY timestamp ASC"),
-            {"id": session_id}
-        )
-        messages_from_db = result.mappings().all()
+    """
+    Get message history, converting GCS URIs to public URLs for previews.
 
-        processed_messages = []
-        signer_email = os.getenv("SIGNER_SERVICE_ACCOUNT_EMAIL")
-        if not signer_email:
-            print("⚠️ SIGNER_SERVICE_ACCOUNT_EMAIL is not set. Image previews will fail.")
-            return jsonify([dict(row) for row in messages_from_db])
+    Rows are ordered by (timestamp, id). Query params: after_id (only
+    messages after this message id; pass the last id received to resume),
+    since (only messages after this timestamp), limit, and stream=1 (or
+    Accept: application/x-ndjson) to receive NDJSON rows as they are read
+    from a server-side cursor.
+    """
+    try:
+        where = "session_id = :id"
+        params = {"id": session_id}
+        after_id = parse_id(request.args["after_id"], "after_id") if request.args.get("after_id") else None
+        if request.args.get("since"):
+            where += " AND timestamp > :since"
+            params["since"] = parse_timestamp(request.args["since"], "since")
+        limit_sql = ""
+        if request.args.get("limit"):
+            limit_sql = "LIMIT :limit"
+            params["limit"] = parse_limit(request.args["limit"], maximum=HISTORY_MAX_LIMIT)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
 
-        for row in messages_from_db:
-            row_dict = dict(row)
+    if after_id is not None:
+        # Resolve the cursor up front: an unknown id (or one from another
+        # session) is a client error, not an empty page.
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text("SELECT timestamp FROM messages WHERE id = :after_id AND session_id = :id"),
+                {"after_id": after_id, "id": session_id},
+            )
+            cursor = result.one_or_none()
+        if cursor is None:
+            return jsonify({"error": "after_id not found in this session"}), 400
+        # Keyset on the full sort key, so messages sharing a timestamp are
+        # neither repeated nor skipped.
+        where += " AND (timestamp, id) > (:after_timestamp, :after_id)"
+        params.update(after_timestamp=cursor.timestamp, after_id=after_id)
+
+    query = text(f"SELECT id, role, text_content, file_url, timestamp FROM messages WHERE {where} ORDER BY timestamp ASC, id ASC {limit_sql}")
+    sign_previews = bool(os.getenv("SIGNER_SERVICE_ACCOUNT_EMAIL"))
+    if not sign_previews:
+        print("⚠️ SIGNER_SERVICE_ACCOUNT_EMAIL is not set. Image previews will fail.")
+
+    async def sign_rows(rows):
+        if not sign_previews:
+            return rows
+        gs_uris = [
+            row["file_url"] for row in rows
+            if row.get("file_url") and row["file_url"].startswith("gs://")
+        ]
+        resolved = await signed_urls.sign_many(gs_uris)
+        for row_dict in rows:
             file_url = row_dict.get("file_url")
-            
-            if file_url and file_url.startswith("gs://"):
-                try:
-                    bucket_name = file_url.split('/')[2]
-                    blob_name = '/'.join(file_url.split('/')[3:])
-                    
-                    bucket = storage_client.bucket(bucket_name)
-                    blob = bucket.blob(blob_name)
-                    
-                    signed_url = blob.generate_signed_url(
-                        version="v4",
-                        expiration=datetime.timedelta(days=1),
-                        method="GET",
-                    )
-                    row_dict["file_url"] = signed_url
-                except Exception as e:
-                    print(f"⚠️ Failed to generate signed URL for {file_url}: {e}")
-            
-            processed_messages.append(row_dict)
+            if file_url in resolved:
+                row_dict["file_url"] = resolved[file_url]
+        return rows
 
-        return jsonify(processed_messages)
+    wants_stream = (
+        request.args.get("stream") in ("1", "true", "ndjson")
+        or request.accept_mimetypes.best == "application/x-ndjson"
+    )
+    if wants_stream:
+        async def generate():
+            async with engine.connect() as conn:
+                result = await conn.stream(query, params)
+                async for partition in result.mappings().partitions(HISTORY_STREAM_BATCH):
+                    rows = await sign_rows([dict(row) for row in partition])
+                    yield "".join(app.json.dumps(row) + "\n" for row in rows).encode()
+
+        return Response(generate(), mimetype="application/x-ndjson")
+
+    async with engine.connect() as conn:
+        result = await conn.execute(query, params)
+        processed_messages = [dict(row) for row in result.mappings().all()]
+
+    return jsonify(await sign_rows(processed_messages))
 
 
 @app.route("/generate-upload-url", methods=["POST"])
@@ -354,6 +572,126 @@ async def confirm_upload():
     
     return jsonify({"message": "File upload confirmed", "file_url": file_url})
 
+
+UPLOAD_BATCH_MAX = 20
+UPLOAD_URL_EXPIRATION = datetime.timedelta(minutes=15)
+
+
+def list_blob_names(prefix):
+    """Names of every object under `prefix` in BUCKET_NAME (one paged listing call)."""
+    blobs = storage_client.list_blobs(BUCKET_NAME, prefix=prefix, fields="items(name),nextPageToken")
+    return {blob.name for blob in blobs}
+
+
+@app.route("/upload-urls", methods=["POST"])
+@require_auth
+async def generate_upload_urls():
+    """
+    Sign PUT URLs for several files of one session in a single call.
+    Body: {"session_id", "files": [{"file_name", "content_type"}, ...]}.
+    No download URLs are signed here; confirm the uploads with /confirm-uploads.
+    """
+    data = await request.get_json()
+    session_id = (data or {}).get("session_id")
+    files = (data or {}).get("files")
+    if not session_id or not isinstance(files, list) or not files:
+        return jsonify({"error": "session_id and a non-empty files list are required"}), 400
+    if len(files) > UPLOAD_BATCH_MAX:
+        return jsonify({"error": f"At most {UPLOAD_BATCH_MAX} files per request"}), 400
+    if not all(isinstance(f, dict) and f.get("file_name") for f in files):
+        return jsonify({"error": "every file needs a file_name"}), 400
+
+    uploads = [
+        {
+            "file_name": f["file_name"],
+            "blob_name": f"uploads/{session_id}/{uuid.uuid4()}-{f['file_name']}",
+            "content_type": f.get("content_type") or "application/octet-stream",
+        }
+        for f in files
+    ]
+    try:
+        upload_urls = await signed_urls.sign_uploads(
+            BUCKET_NAME,
+            [(u["blob_name"], u["content_type"]) for u in uploads],
+            expiration=UPLOAD_URL_EXPIRATION,
+        )
+    except Exception as e:
+        print("❌ Error generating signed upload URLs:", traceback.format_exc())
+        return jsonify({"error": "Failed to generate signed URLs", "message": str(e)}), 500
+
+    for upload, upload_url in zip(uploads, upload_urls):
+        upload["upload_url"] = upload_url
+    return jsonify({
+        "bucket": BUCKET_NAME,
+        "expires_in": int(UPLOAD_URL_EXPIRATION.total_seconds()),
+        "uploads": uploads,
+    })
+
+
+@app.route("/confirm-uploads", methods=["POST"])
+@require_auth
+async def confirm_uploads():
+    """
+    Confirm several uploads of one session at once.
+    Body: {"session_id", "files": [{"blob_name", "original_filename"}, ...],
+    "download_urls": false}. Blob existence is checked with one listing of the
+    session's upload prefix, and all found files are recorded as messages by a
+    single INSERT. Download URLs are only signed when `download_urls` is true.
+    """
+    data = await request.get_json()
+    session_id = (data or {}).get("session_id")
+    files = (data or {}).get("files")
+    if not session_id or not isinstance(files, list) or not files:
+        return jsonify({"error": "session_id and a non-empty files list are required"}), 400
+    if len(files) > UPLOAD_BATCH_MAX:
+        return jsonify({"error": f"At most {UPLOAD_BATCH_MAX} files per request"}), 400
+    prefix = f"uploads/{session_id}/"
+    if not all(isinstance(f, dict) and str(f.get("blob_name", "")).startswith(prefix) for f in files):
+        return jsonify({"error": f"every blob_name must start with {prefix}"}), 400
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
+
+    try:
+        loop = asyncio.get_running_loop()
+        existing = await loop.run_in_executor(None, list_blob_names, prefix)
+    except Exception as e:
+        print("❌ Error checking uploaded blobs:", traceback.format_exc())
+        return jsonify({"error": "Failed to verify uploads", "message": str(e)}), 502
+
+    found = list({f["blob_name"]: f for f in files if f["blob_name"] in existing}.values())
+    missing = [f["blob_name"] for f in files if f["blob_name"] not in existing]
+    confirmed = []
+    if found:
+        file_urls = [f"gs://{BUCKET_NAME}/{f['blob_name']}" for f in found]
+        filenames = [
+            f"📎 {f.get('original_filename') or f['blob_name'].rsplit('/', 1)[-1]}" for f in found
+        ]
+        try:
+            async with engine.begin() as conn:
+                result = await conn.execute(
+                    text("""
+                        INSERT INTO messages (session_id, role, text_content, file_url)
+                        SELECT :session_id, 'user', filename, file_url
+                        FROM unnest(CAST(:filenames AS text[]), CAST(:file_urls AS text[]))
+                            WITH ORDINALITY AS f(filename, file_url, ord)
+                        ORDER BY ord
+                        RETURNING id, file_url
+                    """),
+                    {"session_id": session_id, "filenames": filenames, "file_urls": file_urls}
+                )
+                message_ids = {row["file_url"]: row["id"] for row in result.mappings().all()}
+        except Exception as e:
+            return jsonify({"error": f"Failed to confirm uploads: {str(e)}"}), 500
+
+        resolved = await signed_urls.sign_many(file_urls) if data.get("download_urls") else {}
+        for f, file_url in zip(found, file_urls):
+            item = {"blob_name": f["blob_name"], "file_url": file_url, "message_id": message_ids.get(file_url)}
+            if file_url in resolved:
+                item["download_url"] = resolved[file_url]
+            confirmed.append(item)
+
+    return jsonify({"confirmed": confirmed, "missing": missing})
+
         
 @app.route("/health", methods=["GET"])
 async def health_check():
@@ -361,8 +699,28 @@ async def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.datetime.now().isoformat(),
-        "database_pool": "initialized" if engine else "not_initialized"
+        "database_pool": "initialized" if engine else "not_initialized",
+        "signed_url_cache": signed_urls.stats(),
+        "comparison_cache": comparison_cache.stats(),
+        "auth_cache": authenticator.stats(),
+        "livekit_token_cache": token_minter.stats(),
+        "idea_events": idea_events.stats(),
+        "duplicate_index": duplicate_index.stats(),
+    })
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    """Prometheus text exposition of request, database, GCS and Gemini metrics."""
+    if engine:
+        update_pool_gauges(engine)
+    update_cache_gauges({
+        "signed_urls": signed_urls.stats(),
+        "comparisons": comparison_cache.stats(),
+        "auth": authenticator.stats(),
+        "livekit_tokens": token_minter.stats(),
+        "duplicates": duplicate_index.stats(),
     })
+    return Response(generate_latest(), content_type=CONTENT_TYPE_LATEST)
 
 @app.route("/health/db", methods=["GET"])
 async def health_check_db():
@@ -429,15 +787,8 @@ async def submit_idea():
                 row = res_user.mappings().one_or_none()
                 created_by = row["created_by"] if row else None
             
-            try:
-                await conn.execute(text("ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS created_by VARCHAR(100)"))
-            except Exception:
-                pass
-            try:
-                await conn.execute(text("ALTER TABLE curated_ideas ADD COLUMN IF NOT EXISTS approved boolean DEFAULT false"))
-            except Exception:
-                pass
-
+            signature = duplicate_index.signature(idea_title, explanation)
+            similar = duplicate_index.candidates(signature, limit=DUPLICATE_SUBMIT_LIMIT)
             result = await conn.execute(
                 text("""
                     INSERT INTO curated_ideas (session_id, created_by, idea_title, explanation, category, 
@@ -458,12 +809,159 @@ async def submit_idea():
                     "approved": False
                 }
             )
-            return jsonify({"message": "Idea submitted successfully", "status": "success"})
+            new_id = result.scalar_one()
+            possible_duplicates = await describe_similar_ideas(conn, similar)
     except Exception as e:
         return jsonify({"error": f"Failed to process idea: {str(e)}"}), 500
 
+    duplicate_index.add(new_id, signature)
+    return jsonify({
+        "message": "Idea submitted successfully",
+        "status": "success",
+        "idea_id": new_id,
+        "possible_duplicates": possible_duplicates,
+    })
+
+
+DUPLICATE_SUBMIT_LIMIT = 5
+
+
+async def describe_similar_ideas(conn, similar):
+    """Expand [(idea_id, similarity)] from the duplicate index into idea summaries, in order."""
+    if not similar:
+        return []
+    result = await conn.execute(
+        text("""
+            SELECT id, session_id, idea_title, category, urgency, approved, submitted_at
+            FROM curated_ideas WHERE id = ANY(:ids)
+        """),
+        {"ids": [idea_id for idea_id, _ in similar]}
+    )
+    rows = {row["id"]: dict(row) for row in result.mappings().all()}
+    return [{**rows[idea_id], "similarity": similarity} for idea_id, similarity in similar if idea_id in rows]
+
+
+@app.route("/ideas/<int:idea_id>/duplicates", methods=["GET"])
+@require_auth
+async def get_idea_duplicates(idea_id):
+    """
+    List likely duplicates of an idea from the in-process MinHash index.
+    Query params: threshold (0-1, default DUPLICATE_THRESHOLD) and limit.
+    """
+    try:
+        limit = parse_limit(request.args.get("limit"), default=10, maximum=100)
+        threshold = None
+        if request.args.get("threshold"):
+            try:
+                threshold = float(request.args["threshold"])
+            except ValueError:
+                raise InvalidQuery("threshold must be a number")
+            if not 0 < threshold <= 1:
+                raise InvalidQuery("threshold must be between 0 and 1")
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
+
+    signature = duplicate_index.signature_of(idea_id)
+    if signature is None:
+        if not duplicate_index.ready:
+            return jsonify({"error": "duplicate_index_loading"}), 503
+        return jsonify({"error": "Idea not found"}), 404
+
+    similar = duplicate_index.candidates(signature, threshold=threshold, limit=limit, exclude=idea_id)
+    try:
+        async with engine.connect() as conn:
+            duplicates = await describe_similar_ideas(conn, similar)
+    except Exception as e:
+        app.logger.error(f"SERVER CRASH in /ideas/<id>/duplicates endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+    return jsonify({"idea_id": idea_id, "duplicates": duplicates})
+
+REVIEW_BATCH_MAX = 500
+
+
+@app.route("/review-ideas", methods=["POST"])
+@require_auth
+async def review_ideas():
+    """
+    Approve or reject many ideas in one transaction.
+
+    Body: {"decisions": [{"idea_id", "approved", "reviewer_notes"}, ...]}. All
+    valid decisions are applied by a single UPDATE ... FROM unnest(...), so the
+    curated_ideas trigger emits one change notification for the whole batch.
+    Returns one result per decision, in request order.
+    """
+    data = await request.get_json()
+    decisions = (data or {}).get("decisions")
+    if not isinstance(decisions, list) or not decisions:
+        return jsonify({"error": "decisions must be a non-empty list"}), 400
+    if len(decisions) > REVIEW_BATCH_MAX:
+        return jsonify({"error": f"At most {REVIEW_BATCH_MAX} decisions per request"}), 400
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
+
+    results = [None] * len(decisions)
+    latest = {}  # idea_id -> index of its last decision (later decisions win)
+    for index, decision in enumerate(decisions):
+        idea_id = decision.get("idea_id") if isinstance(decision, dict) else None
+        approved = decision.get("approved") if isinstance(decision, dict) else None
+        if not isinstance(idea_id, int) or isinstance(idea_id, bool) or not isinstance(approved, bool):
+            results[index] = {"idea_id": idea_id, "status": "invalid",
+                              "error": "idea_id must be an integer and approved a boolean"}
+            continue
+        notes = decision.get("reviewer_notes")
+        if notes is not None and not isinstance(notes, str):
+            results[index] = {"idea_id": idea_id, "status": "invalid",
+                              "error": "reviewer_notes must be a string"}
+            continue
+        if idea_id in latest:
+            results[latest[idea_id]] = {"idea_id": idea_id, "status": "superseded"}
+        latest[idea_id] = index
+
+    if latest:
+        ids = list(latest)
+        try:
+            async with engine.begin() as conn:
+                updated = await conn.execute(
+                    text("""
+                        UPDATE curated_ideas AS ci
+                        SET approved = d.approved,
+                            reviewer_notes = d.reviewer_notes,
+                            reviewed_at = NOW()
+                        FROM unnest(
+                            CAST(:ids AS integer[]),
+                            CAST(:approved AS boolean[]),
+                            CAST(:notes AS text[])
+                        ) AS d(idea_id, approved, reviewer_notes)
+                        WHERE ci.id = d.idea_id
+                        RETURNING ci.id
+                    """),
+                    {
+                        "ids": ids,
+                        "approved": [decisions[latest[i]]["approved"] for i in ids],
+                        "notes": [decisions[latest[i]].get("reviewer_notes") or "" for i in ids],
+                    }
+                )
+                updated_ids = set(updated.scalars().all())
+        except Exception as e:
+            return jsonify({"error": f"Failed to apply reviews: {str(e)}"}), 500
+
+        for idea_id, index in latest.items():
+            if idea_id not in updated_ids:
+                results[index] = {"idea_id": idea_id, "status": "not_found"}
+            else:
+                approved = decisions[index]["approved"]
+                results[index] = {"idea_id": idea_id, "status": "approved" if approved else "rejected"}
+
+    return jsonify({
+        "results": results,
+        "updated": sum(1 for r in results if r["status"] in ("approved", "rejected")),
+    })
+
 @app.route("/ideas/<session_id>", methods=["GET"])
 @require_auth
+@conditional_get("curated_ideas")
 async def get_session_ideas(session_id):
     """Get curated ideas for a specific session."""
     if not engine:
@@ -484,35 +982,98 @@ async def get_session_ideas(session_id):
         ideas = result.mappings().all()
         return jsonify([dict(row) for row in ideas])
 
+IDEA_LIST_FIELDS = {
+    "id": "ci.id",
+    "session_id": "ci.session_id",
+    "idea_title": "ci.idea_title",
+    "explanation": "ci.explanation",
+    "category": "ci.category",
+    "expected_impact": "ci.expected_impact",
+    "estimated_cost": "ci.estimated_cost",
+    "urgency": "ci.urgency",
+    "status": "ci.status",
+    "submitted_at": "ci.submitted_at",
+    "approved": "ci.approved",
+    "reviewer_notes": "ci.reviewer_notes",
+    "reviewed_at": "ci.reviewed_at",
+    "created_by": "ci.created_by",
+    "session_name": "s.name",
+}
+IDEA_LIST_FILTERS = ("category", "urgency", "created_by")
+
+
 @app.route("/ideas", methods=["GET"])
 @require_auth
+@conditional_get("curated_ideas", "sessions", "attachments", signed=True)
 async def get_all_ideas():
-    """Get all curated ideas and attach associated signed image URLs."""
+    """
+    List curated ideas newest-first, one keyset page at a time.
+
+    Query params: limit, cursor, category, urgency, approved, created_by and
+    fields (comma-separated projection; include image_urls to get previews).
+    The cursor for the next page is returned in the X-Next-Cursor header.
+    """
     if not engine:
         return jsonify([])
-    
+
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        cursor = request.args.get("cursor")
+        fields_param = request.args.get("fields")
+        if fields_param:
+            fields = [f.strip() for f in fields_param.split(",") if f.strip()]
+            unknown = [f for f in fields if f not in IDEA_LIST_FIELDS and f != "image_urls"]
+            if unknown:
+                raise InvalidQuery(f"unknown fields: {', '.join(unknown)}")
+        else:
+            fields = list(IDEA_LIST_FIELDS) + ["image_urls"]
+
+        where = []
+        params = {"limit": limit + 1}
+        for name in IDEA_LIST_FILTERS:
+            value = request.args.get(name)
+            if value:
+                where.append(f"ci.{name} = :{name}")
+                params[name] = value
+        if request.args.get("approved"):
+            # Unreviewed agent ideas have approved NULL; they count as not approved.
+            approved = parse_bool(request.args["approved"], "approved")
+            where.append("ci.approved IS TRUE" if approved else "ci.approved IS NOT TRUE")
+        if cursor:
+            params["cursor_ts"], params["cursor_id"] = decode_cursor(cursor)
+            where.append("(ci.submitted_at, ci.id) < (:cursor_ts, :cursor_id)")
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+
+    # id, session_id and submitted_at are always read for the cursor and image lookup.
+    selected = dict.fromkeys(["id", "session_id", "submitted_at"] + [f for f in fields if f != "image_urls"])
+    columns = ", ".join(f"{IDEA_LIST_FIELDS[f]} AS {f}" for f in selected)
+    join = "LEFT JOIN sessions s ON ci.session_id = s.id" if "session_name" in selected else ""
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
     try:
         async with engine.connect() as conn:
             ideas_result = await conn.execute(
-                text("""
-                    SELECT ci.id, ci.session_id, ci.idea_title, ci.explanation, ci.category, 
-                           ci.expected_impact, ci.estimated_cost, ci.urgency, ci.status, 
-                           ci.submitted_at, ci.approved, ci.reviewer_notes, ci.reviewed_at, 
-                           ci.created_by, s.name as session_name
+                text(f"""
+                    SELECT {columns}
                     FROM curated_ideas ci
-                    LEFT JOIN sessions s ON ci.session_id = s.id
-                    ORDER BY ci.submitted_at DESC
-                """)
+                    {join}
+                    {where_sql}
+                    ORDER BY ci.submitted_at DESC, ci.id DESC
+                    LIMIT :limit
+                """),
+                params
             )
             ideas = [dict(row) for row in ideas_result.mappings().all()]
 
-            if not ideas:
-                return jsonify([])
-
-            session_ids = list(set(idea["session_id"] for idea in ideas))
+            next_cursor = None
+            if len(ideas) > limit:
+                ideas = ideas[:limit]
+                next_cursor = encode_cursor(ideas[-1]["submitted_at"], ideas[-1]["id"])
 
-            images_by_session = {}
-            if session_ids:
+            if ideas and "image_urls" in fields:
+                session_ids = list(set(idea["session_id"] for idea in ideas))
+                images_by_session = {}
                 image_messages_result = await conn.execute(
                     text("""
                         SELECT session_id, file_url FROM messages
@@ -521,39 +1082,246 @@ async def get_all_ideas():
                     {"sids": session_ids}
                 )
                 image_messages = image_messages_result.mappings().all()
+                resolved = await signed_urls.sign_many(msg["file_url"] for msg in image_messages)
 
                 for msg in image_messages:
-                    session_id = msg["session_id"]
-                    if session_id not in images_by_session:
-                        images_by_session[session_id] = []
-                    
-                    file_url = msg["file_url"]
-                    try:
-                        bucket_name = file_url.split('/')[2]
-                        blob_name = '/'.join(file_url.split('/')[3:])
-                        bucket = storage_client.bucket(bucket_name)
-                        blob = bucket.blob(blob_name)
-                        signed_url = blob.generate_signed_url(
-                            version="v4", expiration=datetime.timedelta(days=1),
-                            method="GET",
-                        )
-                        images_by_session[session_id].append(signed_url)
-                    except Exception as e:
-                        app.logger.error(f"Failed to generate signed URL for {file_url}: {e}")
-
-            for idea in ideas:
-                idea["image_urls"] = images_by_session.get(idea["session_id"], [])
-            
-            return jsonify(ideas)
+                    signed_url = resolved.get(msg["file_url"])
+                    if signed_url:
+                        images_by_session.setdefault(msg["session_id"], []).append(signed_url)
+
+                for idea in ideas:
+                    idea["image_urls"] = images_by_session.get(idea["session_id"], [])
+
+        ideas = [{f: idea[f] for f in fields} for idea in ideas]
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return jsonify(ideas), 200, headers
 
     except Exception as e:
         app.logger.error(f"SERVER CRASH in /ideas endpoint: {e}")
         return jsonify({"error": "An internal server error occurred"}), 500
-    
+
+SEARCH_MAX_OFFSET = 1000
+SEARCH_HEADLINE_OPTIONS = "MaxFragments=2, MaxWords=20, MinWords=5, StartSel=<b>, StopSel=</b>"
+# scope -> (table, returned columns, text column used for the snippet)
+SEARCH_SCOPES = {
+    "ideas": ("curated_ideas", "id, session_id, idea_title, category, urgency, approved, submitted_at", "explanation"),
+    "messages": ("messages", "id, session_id, role, timestamp", "text_content"),
+}
+
+
+@app.route("/search", methods=["GET"])
+@require_auth
+async def search():
+    """
+    Full-text search over ideas or transcript messages, best matches first.
+
+    Query params: q (web-search syntax: quoted phrases, OR, -term), scope
+    (ideas or messages), limit and offset. Matches English stems as well as
+    exact Hindi/Marathi words; snippets are only built for the returned page.
+    """
+    if not engine:
+        return jsonify({"results": [], "next_offset": None})
+
+    try:
+        query = (request.args.get("q") or "").strip()
+        if not query:
+            raise InvalidQuery("q is required")
+        scope = request.args.get("scope", "ideas")
+        if scope not in SEARCH_SCOPES:
+            raise InvalidQuery(f"scope must be one of: {', '.join(SEARCH_SCOPES)}")
+        limit = parse_limit(request.args.get("limit"), default=20, maximum=100)
+        try:
+            offset = int(request.args.get("offset") or 0)
+        except ValueError:
+            raise InvalidQuery("offset must be an integer")
+        if not 0 <= offset <= SEARCH_MAX_OFFSET:
+            raise InvalidQuery(f"offset must be between 0 and {SEARCH_MAX_OFFSET}")
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+
+    table, columns, snippet_column = SEARCH_SCOPES[scope]
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"""
+                    WITH q AS (
+                        SELECT websearch_to_tsquery('english', :q) || websearch_to_tsquery('simple', :q) AS query
+                    ),
+                    page AS (
+                        SELECT {columns}, {snippet_column}, ts_rank(t.search_vector, q.query) AS rank
+                        FROM {table} t, q
+                        WHERE t.search_vector @@ q.query
+                        ORDER BY rank DESC, t.id DESC
+                        LIMIT :limit OFFSET :offset
+                    )
+                    SELECT {columns}, rank,
+                           ts_headline('simple', coalesce({snippet_column}, ''), q.query, :headline) AS snippet
+                    FROM page, q
+                    ORDER BY rank DESC, id DESC
+                """),
+                {"q": query, "limit": limit + 1, "offset": offset, "headline": SEARCH_HEADLINE_OPTIONS}
+            )
+            results = [dict(row) for row in result.mappings().all()]
+
+        next_offset = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_offset = offset + limit
+        return jsonify({"results": results, "next_offset": next_offset})
+
+    except Exception as e:
+        app.logger.error(f"SERVER CRASH in /search endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+# group_by name -> idea_rollups expression
+ANALYTICS_DIMENSIONS = {
+    "day": "to_char(day, 'YYYY-MM-DD')",
+    "category": "category",
+    "urgency": "urgency",
+    "created_by": "created_by",
+}
+
+
+@app.route("/analytics/ideas", methods=["GET"])
+@require_auth
+@conditional_get("curated_ideas")
+async def idea_analytics():
+    """
+    Idea counts for dashboard summary cards, read from the trigger-maintained
+    idea_rollups table, so the cost depends on the date range and not on how
+    many ideas exist.
+
+    Query params: from, to (inclusive UTC dates, YYYY-MM-DD) and group_by
+    (comma-separated: day, category, urgency, created_by; default category).
+    """
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
+
+    try:
+        group_param = request.args.get("group_by", "category")
+        group_by = list(dict.fromkeys(d.strip() for d in group_param.split(",") if d.strip()))
+        unknown = [d for d in group_by if d not in ANALYTICS_DIMENSIONS]
+        if unknown:
+            raise InvalidQuery(f"unknown group_by: {', '.join(unknown)}")
+        where = []
+        params = {}
+        if request.args.get("from"):
+            params["from_day"] = parse_date(request.args["from"], "from")
+            where.append("day >= :from_day")
+        if request.args.get("to"):
+            params["to_day"] = parse_date(request.args["to"], "to")
+            where.append("day <= :to_day")
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+
+    columns = "".join(f"{ANALYTICS_DIMENSIONS[d]} AS {d}, " for d in group_by)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+    group_sql = f"GROUP BY {', '.join(group_by)} ORDER BY {', '.join(group_by)}" if group_by else ""
+
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(f"""
+                    SELECT {columns}
+                           sum(ideas)::bigint AS ideas,
+                           sum(approved)::bigint AS approved,
+                           sum(reviewed)::bigint AS reviewed
+                    FROM idea_rollups
+                    {where_sql}
+                    {group_sql}
+                """),
+                params
+            )
+            rows = result.mappings().all()
+    except Exception as e:
+        app.logger.error(f"SERVER CRASH in /analytics/ideas endpoint: {e}")
+        return jsonify({"error": "An internal server error occurred"}), 500
+
+    groups = []
+    totals = {"ideas": 0, "approved": 0, "rejected": 0, "pending": 0}
+    for row in rows:
+        if not row["ideas"]:
+            continue
+        counts = {
+            "ideas": row["ideas"],
+            "approved": row["approved"],
+            "rejected": row["reviewed"] - row["approved"],
+            "pending": row["ideas"] - row["reviewed"],
+        }
+        for key, value in counts.items():
+            totals[key] += value
+        groups.append({**{d: row[d] for d in group_by}, **counts})
+
+    return jsonify({"totals": totals, "groups": groups if group_by else []})
+
+
+IDEA_EVENTS_HEARTBEAT_SECONDS = 15
+
+
+def sse_event(event, payload):
+    """Format one server-sent event."""
+    return f"event: {event}\ndata: {app.json.dumps(payload)}\n\n".encode()
+
+
+@app.route("/events/token", methods=["POST"])
+@require_auth
+async def issue_events_token():
+    """Short-lived token for opening /events/ideas?token=... from a browser EventSource."""
+    return jsonify({
+        "token": stream_tokens.issue(g.user, IDEA_EVENTS_SCOPE),
+        "expires_in": stream_tokens.ttl,
+    })
+
+
+@app.route("/events/ideas", methods=["GET"])
+async def stream_idea_events():
+    """
+    Server-sent events for new and reviewed ideas, fed by Postgres LISTEN/NOTIFY.
+    Emits `idea` events with the changed rows, `resync` when the client may have
+    missed events (it should re-fetch /ideas), and periodic heartbeat comments.
+
+    Authenticated by Basic auth or by a `token` query parameter from
+    /events/token. The token is only checked when the stream opens.
+    """
+    token = request.args.get("token")
+    if token:
+        if not stream_tokens.verify(token, IDEA_EVENTS_SCOPE):
+            return jsonify({"error": "Invalid or expired token"}), 401
+    else:
+        if not engine:
+            return jsonify({"error": "database_unavailable"}), 503
+        auth = request.authorization
+        if not (auth and await authenticator.authenticate(engine, auth.username, auth.password)):
+            return (
+                jsonify({"error": "Unauthorized access"}),
+                401,
+                {'WWW-Authenticate': 'Basic realm="Login Required"'}
+            )
+    subscription = idea_events.subscribe()
+
+    async def generate():
+        try:
+            yield b": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), timeout=IDEA_EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                yield sse_event("resync" if event.get("type") == "resync" else "idea", event)
+        finally:
+            idea_events.unsubscribe(subscription)
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
 @app.route("/compare-ideas", methods=["POST"])
 @require_auth
 async def compare_ideas():
-    """Compare two ideas using Gemini API."""
+    """Compare two ideas using Gemini API, serving repeats from the comparison cache."""
     try:
         data = await request.get_json()
         idea1 = data.get('idea1')
@@ -563,65 +1331,237 @@ async def compare_ideas():
             return jsonify({"error": "Both ideas are required"}), 400
         
         try:
-            api_key = os.getenv("GEMINI_API_KEY")
-            if not api_key:
-                return jsonify({"error": "Gemini API key not configured"}), 500
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-2.5-flash')
-
-            prompt = f"""
-            Please compare these two ideas in a structured format:
-
-            Idea 1:
-            Title: {idea1.get('idea_title', 'N/A')}
-            Description: {idea1.get('explanation', 'N/A')}
-            Category: {idea1.get('category', 'N/A')}
-            Expected Impact: {idea1.get('expected_impact', 'N/A')}
-            Estimated Cost: {idea1.get('estimated_cost', 'N/A')}
-            Urgency: {idea1.get('urgency', 'N/A')}
-
-            Idea 2:
-            Title: {idea2.get('idea_title', 'N/A')}
-            Description: {idea2.get('explanation', 'N/A')}
-            Category: {idea2.get('category', 'N/A')}
-            Expected Impact: {idea2.get('expected_impact', 'N/A')}
-            Estimated Cost: {idea2.get('estimated_cost', 'N/A')}
-            Urgency: {idea2.get('urgency', 'N/A')}
-
-            Provide a detailed comparison covering: Similarities, Feasibility, Impact, Cost-benefit, and a final Recommendation.
-            Format the response in a clear, structured manner with headings and bullet points.
-            """
-            
-            response = model.generate_content(prompt)
-            comparison_text = response.text
+            first, second, cache_key = canonical_pair(idea1, idea2)
+            comparison_text = await comparison_cache.get(engine, cache_key)
+            cached = comparison_text is not None
+
+            if not cached:
+                comparison_text = await llm.generate(build_comparison_prompt(first, second))
+                try:
+                    await comparison_cache.put(
+                        engine, cache_key, comparison_text, llm.model_name,
+                        payload_idea_id(first), payload_idea_id(second),
+                    )
+                except Exception as e:
+                    print(f"⚠️ Failed to store comparison {cache_key[:12]}: {e}")
             
             return jsonify({
                 "comparison": comparison_text,
                 "idea1_title": idea1.get('idea_title'),
-                "idea2_title": idea2.get('idea_title')
+                "idea2_title": idea2.get('idea_title'),
+                "cached": cached,
             })
             
+        except LLMNotConfigured as e:
+            return jsonify({"error": str(e)}), 500
+        except asyncio.TimeoutError:
+            return jsonify({"error": f"Gemini API timed out after {llm.timeout:g}s"}), 504
         except Exception as e:
             return jsonify({"error": f"Gemini API error: {str(e)}"}), 500
             
     except Exception as e:
         return jsonify({"error": f"Server error: {str(e)}"}), 500
 
+@app.route("/compare-ideas/stream", methods=["POST"])
+@require_auth
+async def compare_ideas_stream():
+    """
+    Streaming variant of /compare-ideas. Emits server-sent events: `meta`, one
+    `chunk` per model output fragment, then `done` with the assembled comparison
+    (or `error`). Generation stops as soon as the client disconnects.
+    """
+    data = await request.get_json()
+    idea1 = (data or {}).get('idea1')
+    idea2 = (data or {}).get('idea2')
+    if not idea1 or not idea2:
+        return jsonify({"error": "Both ideas are required"}), 400
+    if not llm.configured:
+        return jsonify({"error": "Gemini API key not configured"}), 500
+
+    first, second, cache_key = canonical_pair(idea1, idea2)
+    titles = {"idea1_title": idea1.get('idea_title'), "idea2_title": idea2.get('idea_title')}
+
+    async def generate():
+        cached_text = await comparison_cache.get(engine, cache_key)
+        yield sse_event("meta", {**titles, "cached": cached_text is not None})
+        if cached_text is not None:
+            yield sse_event("chunk", {"text": cached_text})
+            yield sse_event("done", {**titles, "comparison": cached_text, "cached": True})
+            return
+
+        parts = []
+        completed = False
+        try:
+            async with aclosing(llm.stream(build_comparison_prompt(first, second))) as chunks:
+                async for chunk in chunks:
+                    parts.append(chunk)
+                    yield sse_event("chunk", {"text": chunk})
+            completed = True
+        except asyncio.TimeoutError:
+            yield sse_event("error", {"error": f"Gemini API timed out after {llm.timeout:g}s"})
+            return
+        except Exception as e:
+            yield sse_event("error", {"error": f"Gemini API error: {str(e)}"})
+            return
+        finally:
+            if not completed:
+                print(f"🔌 Comparison stream {cache_key[:12]} ended early after {len(parts)} chunks.")
+
+        comparison_text = "".join(parts)
+        try:
+            await comparison_cache.put(
+                engine, cache_key, comparison_text, llm.model_name,
+                payload_idea_id(first), payload_idea_id(second),
+            )
+        except Exception as e:
+            print(f"⚠️ Failed to store comparison {cache_key[:12]}: {e}")
+        yield sse_event("done", {**titles, "comparison": comparison_text, "cached": False})
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None
+    return response
+
+RANK_MAX_IDEAS = int(os.getenv("RANK_MAX_IDEAS", "50"))
+RANK_GROUP_SIZE = int(os.getenv("RANK_GROUP_SIZE", "8"))
+
+
+async def score_idea_group(group):
+    """Score one group of ideas, reusing a cached result when the group is unchanged."""
+    cache_key = ranking_key(group)
+    group_ids = [idea["id"] for idea in group]
+    cached_text = await comparison_cache.get(engine, cache_key)
+    if cached_text is not None:
+        return parse_ranking(cached_text, group_ids), True
+    response_text = await llm.generate(build_ranking_prompt(group))
+    scores = parse_ranking(response_text, group_ids)
+    try:
+        await comparison_cache.put(
+            engine, cache_key, response_text, llm.model_name, prompt_version=RANKING_PROMPT_VERSION
+        )
+    except Exception as e:
+        print(f"⚠️ Failed to store ranking {cache_key[:12]}: {e}")
+    return scores, False
+
+
+@app.route("/rank-ideas", methods=["POST"])
+@require_auth
+async def rank_ideas():
+    """
+    Rank a shortlist of ideas in one request. The ideas are loaded in a single
+    query, split into groups of RANK_GROUP_SIZE and scored concurrently (bounded
+    by the shared Gemini client's concurrency cap).
+    """
+    data = await request.get_json()
+    idea_ids = (data or {}).get("idea_ids") or []
+    if not isinstance(idea_ids, list) or not all(
+        isinstance(i, int) and not isinstance(i, bool) for i in idea_ids
+    ):
+        return jsonify({"error": "idea_ids must be a list of integers"}), 400
+    idea_ids = list(dict.fromkeys(idea_ids))
+    if len(idea_ids) < 2:
+        return jsonify({"error": "At least two idea_ids are required"}), 400
+    if len(idea_ids) > RANK_MAX_IDEAS:
+        return jsonify({"error": f"At most {RANK_MAX_IDEAS} ideas can be ranked at once"}), 400
+    if not engine:
+        return jsonify({"error": "database_unavailable"}), 503
+    if not llm.configured:
+        return jsonify({"error": "Gemini API key not configured"}), 500
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("""
+                SELECT id, idea_title, explanation, category, expected_impact,
+                       estimated_cost, urgency
+                FROM curated_ideas
+                WHERE id = ANY(:ids)
+                ORDER BY id
+            """),
+            {"ids": idea_ids}
+        )
+        ideas = [dict(row) for row in result.mappings().all()]
+
+    found = {idea["id"] for idea in ideas}
+    missing_ids = [i for i in idea_ids if i not in found]
+    if len(ideas) < 2:
+        return jsonify({"error": "Fewer than two of the requested ideas exist", "missing_ids": missing_ids}), 404
+
+    groups = [ideas[i:i + RANK_GROUP_SIZE] for i in range(0, len(ideas), RANK_GROUP_SIZE)]
+    results = await asyncio.gather(*(score_idea_group(group) for group in groups), return_exceptions=True)
+
+    scores = {}
+    cached_groups = 0
+    failed_groups = 0
+    for outcome in results:
+        if isinstance(outcome, asyncio.TimeoutError):
+            failed_groups += 1
+            print(f"⚠️ Ranking group timed out after {llm.timeout:g}s")
+            continue
+        if isinstance(outcome, Exception):
+            failed_groups += 1
+            print(f"⚠️ Ranking group failed: {outcome}")
+            continue
+        group_scores, cached = outcome
+        scores.update(group_scores)
+        cached_groups += cached
+
+    if failed_groups == len(groups):
+        return jsonify({"error": "Gemini API error: no idea group could be scored"}), 502
+
+    ranked = sorted(
+        (idea for idea in ideas if idea["id"] in scores),
+        key=lambda idea: (-scores[idea["id"]]["score"], idea["id"]),
+    )
+    return jsonify({
+        "ranking": [
+            {
+                "rank": position,
+                "id": idea["id"],
+                "idea_title": idea["idea_title"],
+                "score": scores[idea["id"]]["score"],
+                "rationale": scores[idea["id"]]["rationale"],
+            }
+            for position, idea in enumerate(ranked, start=1)
+        ],
+        "unscored_ids": [idea["id"] for idea in ideas if idea["id"] not in scores],
+        "missing_ids": missing_ids,
+        "groups": len(groups),
+        "cached_groups": cached_groups,
+    })
+
+TOKEN_BATCH_MAX = 50
+
+
 @app.route("/getToken", methods=["GET"])
 @require_auth
 async def get_token():
-    """Get a LiveKit token."""
+    """Get a LiveKit token (reused from the token cache until close to expiry)."""
     session_id = request.args.get("session_id")
     participant_name = request.args.get("name", "human-user")
     if not session_id:
         return jsonify({"error": "session_id is required"}), 400
     
-    token = api.AccessToken(os.getenv("LIVEKIT_API_KEY"), os.getenv("LIVEKIT_API_SECRET")) \
-        .with_identity(participant_name) \
-        .with_name(participant_name) \
-        .with_grants(api.VideoGrants(room_join=True, room=session_id))
-        
-    return jsonify({"token": token.to_jwt()})
+    token, expires_at = token_minter.mint(session_id, participant_name)
+    return jsonify({"token": token, "expires_at": expires_at.isoformat()})
+
+@app.route("/getTokens", methods=["POST"])
+@require_auth
+async def get_tokens():
+    """Get LiveKit tokens for several sessions in one request."""
+    data = await request.get_json()
+    session_ids = (data or {}).get("session_ids") or []
+    participant_name = (data or {}).get("name", "human-user")
+    if not isinstance(session_ids, list) or not session_ids:
+        return jsonify({"error": "session_ids must be a non-empty list"}), 400
+    if len(session_ids) > TOKEN_BATCH_MAX:
+        return jsonify({"error": f"At most {TOKEN_BATCH_MAX} session_ids per request"}), 400
+
+    tokens = {}
+    for session_id in dict.fromkeys(str(sid) for sid in session_ids):
+        token, expires_at = token_minter.mint(session_id, participant_name)
+        tokens[session_id] = {"token": token, "expires_at": expires_at.isoformat()}
+    return jsonify({"tokens": tokens})
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5001))
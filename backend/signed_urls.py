@@ -0,0 +1,141 @@
+# signed_urls.py
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import GCS_SIGN_SECONDS
+
+
+def split_gs_uri(gs_uri):
+    """Split a gs://bucket/path URI into (bucket_name, blob_name)."""
+    parts = gs_uri.split('/')
+    return parts[2], '/'.join(parts[3:])
+
+
+class SignedUrlCache:
+    """
+    Process-wide cache of V4 GET signed URLs keyed by gs:// URI.
+
+    Entries are reused until `refresh_margin` before they expire and evicted
+    least-recently-used once `max_entries` is reached. Misses are signed in
+    parallel on a small thread pool so that IAM signBlob round trips never run
+    on the event loop.
+    """
+
+    def __init__(
+        self,
+        storage_client,
+        expiration=datetime.timedelta(days=1),
+        refresh_margin=datetime.timedelta(minutes=30),
+        max_entries=10000,
+        max_workers=16,
+    ):
+        self._storage_client = storage_client
+        self._expiration = expiration
+        self._ttl = (expiration - refresh_margin).total_seconds()
+        self._max_entries = max_entries
+        self._entries = OrderedDict()  # gs_uri -> (signed_url, reuse_until)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gcs-sign")
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _lookup(self, gs_uri, now):
+        entry = self._entries.get(gs_uri)
+        if entry is None:
+            return None
+        signed_url, reuse_until = entry
+        if reuse_until <= now:
+            del self._entries[gs_uri]
+            return None
+        self._entries.move_to_end(gs_uri)
+        return signed_url
+
+    def _store(self, gs_uri, signed_url, now):
+        self._entries[gs_uri] = (signed_url, now + self._ttl)
+        self._entries.move_to_end(gs_uri)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _sign(self, gs_uri):
+        bucket_name, blob_name = split_gs_uri(gs_uri)
+        blob = self._storage_client.bucket(bucket_name).blob(blob_name)
+        with GCS_SIGN_SECONDS.time():
+            return blob.generate_signed_url(
+                version="v4",
+                expiration=self._expiration,
+                method="GET",
+            )
+
+    async def sign_many(self, gs_uris):
+        """
+        Resolve signed URLs for every URI in one batch.
+        Returns a dict of gs_uri -> signed_url; URIs that failed to sign are omitted.
+        """
+        now = time.monotonic()
+        resolved = {}
+        missing = []
+        for gs_uri in dict.fromkeys(gs_uris):
+            signed_url = self._lookup(gs_uri, now)
+            if signed_url is not None:
+                self.hits += 1
+                resolved[gs_uri] = signed_url
+            else:
+                self.misses += 1
+                missing.append(gs_uri)
+
+        if not missing:
+            return resolved
+
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, self._sign, gs_uri) for gs_uri in missing),
+            return_exceptions=True,
+        )
+        now = time.monotonic()
+        for gs_uri, result in zip(missing, results):
+            if isinstance(result, Exception):
+                self.errors += 1
+                print(f"⚠️ Failed to generate signed URL for {gs_uri}: {result}")
+                continue
+            self._store(gs_uri, result, now)
+            resolved[gs_uri] = result
+        return resolved
+
+    def _sign_upload(self, bucket_name, blob_name, content_type, expiration):
+        blob = self._storage_client.bucket(bucket_name).blob(blob_name)
+        with GCS_SIGN_SECONDS.time():
+            return blob.generate_signed_url(
+                version="v4",
+                expiration=expiration,
+                method="PUT",
+                content_type=content_type,
+            )
+
+    async def sign_uploads(self, bucket_name, uploads, expiration=datetime.timedelta(minutes=15)):
+        """
+        Sign one PUT URL per (blob_name, content_type), in parallel on the signing pool.
+        Upload URLs are single-purpose and never cached. Raises if any signing fails.
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(self._executor, self._sign_upload, bucket_name, blob_name, content_type, expiration)
+            for blob_name, content_type in uploads
+        ))
+
+    async def sign(self, gs_uri):
+        """Resolve a single signed URL, or None if signing failed."""
+        return (await self.sign_many([gs_uri])).get(gs_uri)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)